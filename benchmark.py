@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool, freeze_support
+
+import pandas as pd
+
+import sites_generator
+from sites_generator import SitesGenerator, CONTAINER_LIST, MASTER_DATA_LIST, MASTER_ABOUT_LIST, \
+    SELECTION_MASTER_LIST, MASTER_EDUCATION, NUM_THREADS
+from site_renderer import init_worker
+from link_pools import LinkPools
+from sitemap_writer import SitemapWriter
+from google_sheets_api import GoogleSheetsApi
+from output_writer import open_output
+
+
+"""Options"""
+CONTAINERS = 1000
+SECTIONS = 10
+MASTERS_PER_SECTION = 30
+ABOUT_PER_MASTER = 2
+EDUCATION_PER_MASTER = 1
+REVIEWS_PER_SECTION = 2000
+RESULT_FILE = 'benchmark.json'
+TABLE_ID = 'synthetic'
+
+
+class SyntheticSheets:
+    # Offline data source with interface of GoogleSheetsApi for download_tables, sheets are generated columns
+    # Accept: sheets - dict {list name: list of columns without header row}
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    # Return: list of mas with data by COLUMNS in order of ranges
+    def get_data_from_sheets_batch(self, table_id, ranges, major_dimension):
+        return [self.sheets[list_name] for list_name, start_range_point, end_range_point in ranges]
+
+
+# Generate sheets columns and reviews of goods.csv layout
+# Return: [dict {list name: list of columns}, reviews data frame]
+def gen_synthetic_data(containers, sections, masters_per_section, about_per_master, education_per_master,
+                       reviews_per_section, seed=0):
+    rand = random.Random(seed)
+    section_ids = ['Section {0}'.format(i) for i in range(sections)]
+
+    container = [[] for i in range(15)]
+    for i in range(containers):
+        row = [section_ids[i % sections], 'online' if i % 3 == 0 else 'City {0}'.format(i % 50),
+               'page-{0}'.format(i), 'Name {0}'.format(i), 'Masters {0}'.format(i), 'Title {0}'.format(i),
+               'Description of page {0}'.format(i), 'Question 1 {0}?'.format(i), 'Answer 1 {0}'.format(i),
+               'Question 2 {0}?'.format(i), 'Answer 2 {0}'.format(i), 'Question 3 {0}?'.format(i),
+               'Answer 3 {0}'.format(i), 'add' if rand.random() < 0.1 else '', 'x' if i % 10 == 0 else '']
+        for column, value in zip(container, row):
+            column.append(value)
+
+    master_data = [[] for i in range(15)]
+    master_about = [[], [], []]
+    section_master = [[], []]
+    master_education = [[], []]
+    for section_id in section_ids:
+        for i in range(masters_per_section):
+            path = '{0}-master-{1}'.format(section_id.replace(' ', '-').lower(), i)
+            row = [path, 'Master {0}'.format(i), 'avatar{0}.svg'.format(i % 20), '4.{0}'.format(i % 10),
+                   str(rand.randint(1, 500)), str(rand.randint(1, 5000)), str(rand.randint(500, 3000))] + \
+                  ['y' if rand.random() < 0.5 else '' for k in range(8)]
+            for column, value in zip(master_data, row):
+                column.append(value)
+            for k in range(about_per_master):
+                master_about[0].append(str(k))
+                master_about[1].append(path)
+                master_about[2].append('About master {0} text {1}. '.format(i, k) * 5)
+            for k in range(education_per_master):
+                master_education[0].append(path)
+                master_education[1].append('University {0}, faculty {1}'.format(i, k))
+            section_master[0].append(section_id)
+            section_master[1].append(path)
+
+    reviews = []
+    for section_id in section_ids:
+        for i in range(reviews_per_section):
+            reviews.append(['Review {0} of section. '.format(i) * rand.randint(3, 15), section_id,
+                            'page', 'model', 'review', 0])
+    review_df = pd.DataFrame(reviews, columns=['review', 'sectionId', 'type_page', 'type_model', 'type_review',
+                                               'used'])
+
+    sheets = {
+        CONTAINER_LIST: container,
+        MASTER_DATA_LIST: master_data,
+        MASTER_ABOUT_LIST: master_about,
+        SELECTION_MASTER_LIST: section_master,
+        MASTER_EDUCATION: master_education,
+    }
+    return [sheets, review_df]
+
+
+# Peak resident memory of process and of its finished children (MB)
+def get_peak_rss():
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+# Stage result
+# Accept: items - count of processed items (pages, sites, urls), start - start time of stage
+def gen_stage_result(items, start):
+    duration = time.time() - start
+    return {
+        'time': duration,
+        'items': items,
+        'items_per_second': items / duration if duration > 0 else None,
+        'peak_rss_mb': get_peak_rss(),
+    }
+
+
+# Load synthetic data to new generator by offline source
+def load_generator(sheets, reviews_csv_file):
+    generator = SitesGenerator(reviews_csv_file)
+    generator.offline = True
+    generator.set_tables(generator.download_tables(SyntheticSheets(sheets), TABLE_ID))
+    return generator
+
+
+# Benchmark every stage of gen_sites separately
+# Return: dict {stage name: stage result}
+def bench_stages(sheets, reviews_csv_file, out_directory):
+    stages = {}
+
+    start = time.time()
+    generator = load_generator(sheets, reviews_csv_file)
+    stages['load'] = gen_stage_result(len(generator.container_df), start)
+
+    sites = generator.container_df.values
+    with Pool(NUM_THREADS, initializer=init_worker, initargs=(generator.renderer,)) as pool:
+        start = time.time()
+        sites_masters = generator.select_sites_masters(pool, sites)
+        stages['master_selection'] = gen_stage_result(len(sites), start)
+
+        start = time.time()
+        sites_plans = generator.allocate_sites_reviews(sites, sites_masters, {})
+        stages['review_allocation'] = gen_stage_result(len(sites), start)
+
+        start = time.time()
+        plans_sites = [site for site, masters, reviews in sites_plans if len(reviews) > 0]
+        link_pools = LinkPools(plans_sites)
+        for site in plans_sites:
+            link_pools.get_links(site)
+        stages['link'] = gen_stage_result(len(plans_sites), start)
+
+        start = time.time()
+        output = open_output(out_directory)
+        sitemap = SitemapWriter(output.directory, sites_generator.SITE_URL)
+        pages = generator.render_sites(pool, output, sites_plans, link_pools, sitemap)
+        sitemap.close()
+        output.close()
+        stages['render'] = gen_stage_result(len(pages), start)
+
+    start = time.time()
+    sitemap_directory = tempfile.mkdtemp()
+    sitemap = SitemapWriter(sitemap_directory, sites_generator.SITE_URL, sites_generator.COMPRESS_SITEMAP)
+    for url_path in pages:
+        sitemap.add(url_path)
+    sitemap.close()
+    shutil.rmtree(sitemap_directory)
+    stages['sitemap'] = gen_stage_result(len(pages), start)
+
+    # Report without sending: diff of column add with downloaded column
+    start = time.time()
+    generator.container_df.loc[generator.container_df['generated'] == True, 'add'] = True
+    add_list = ['add' if item else '' for item in generator.container_df['add'].tolist()]
+    downloaded_add_list = ['add' if item else '' for item in generator.downloaded_add]
+    ranges = GoogleSheetsApi.gen_column_changes_ranges(CONTAINER_LIST, 'N', 2, downloaded_add_list, add_list)
+    stages['report'] = gen_stage_result(len(add_list), start)
+    stages['report']['ranges'] = len(ranges)
+
+    return stages
+
+
+# Benchmark full gen_sites on new generator
+def bench_full(sheets, reviews_csv_file, out_directory):
+    start = time.time()
+    generator = load_generator(sheets, reviews_csv_file)
+    generator.gen_sites(None, TABLE_ID, out_directory)
+    result = gen_stage_result(int((generator.container_df['generated'] == True).sum()), start)
+    result['metrics'] = generator.metrics.to_dict()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of sites generation on synthetic data')
+    parser.add_argument('--containers', type=int, default=CONTAINERS)
+    parser.add_argument('--sections', type=int, default=SECTIONS)
+    parser.add_argument('--masters-per-section', type=int, default=MASTERS_PER_SECTION)
+    parser.add_argument('--about-per-master', type=int, default=ABOUT_PER_MASTER)
+    parser.add_argument('--education-per-master', type=int, default=EDUCATION_PER_MASTER)
+    parser.add_argument('--reviews-per-section', type=int, default=REVIEWS_PER_SECTION)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=None, help='CHUNK_SIZE of full run')
+    parser.add_argument('--pipeline', action='store_true', help='PIPELINE of full run')
+    parser.add_argument('--out', default=RESULT_FILE, help='JSON file of results')
+    args = parser.parse_args()
+    # Metrics of full run are saved in result
+    sites_generator.METRICS_FILE = None
+    sites_generator.CHUNK_SIZE = args.chunk_size
+    sites_generator.PIPELINE = args.pipeline
+
+    config = vars(args).copy()
+    del config['out']
+    sheets, review_df = gen_synthetic_data(args.containers, args.sections, args.masters_per_section,
+                                           args.about_per_master, args.education_per_master,
+                                           args.reviews_per_section, args.seed)
+
+    work_directory = tempfile.mkdtemp()
+    try:
+        reviews_csv_file = os.path.join(work_directory, 'goods.csv')
+        review_df.to_csv(reviews_csv_file, sep='\t', index=False)
+
+        stages_directory = os.path.join(work_directory, 'stages') + os.sep
+        full_directory = os.path.join(work_directory, 'full') + os.sep
+        os.makedirs(stages_directory)
+        os.makedirs(full_directory)
+
+        stages = bench_stages(sheets, reviews_csv_file, stages_directory)
+        full = bench_full(sheets, reviews_csv_file, full_directory)
+    finally:
+        shutil.rmtree(work_directory)
+
+    result = {
+        'config': config,
+        'num_threads': NUM_THREADS,
+        'stages': stages,
+        'full': full,
+        'pages_per_second': full['items_per_second'],
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+
+    for name, stage in list(stages.items()) + [['full', full]]:
+        print('{0:<18} {1:>9.3f} s {2:>8} items {3:>12.1f} items/s'.format(
+            name, stage['time'], stage['items'], stage['items_per_second'] or 0))
+    print('Peak RSS (MB):', full['peak_rss_mb'])
+
+
+if __name__ == '__main__':
+    freeze_support()
+    main()
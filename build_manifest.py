@@ -0,0 +1,55 @@
+import hashlib
+import json
+import os
+
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+# Stable hash of list of values
+def hash_values(values):
+    return hashlib.sha1(json.dumps([str(value) for value in values], ensure_ascii=False).encode('utf-8'))\
+        .hexdigest()
+
+
+# Hash of files content
+def hash_files(files):
+    sha = hashlib.sha1()
+    for file_name in files:
+        with open(file_name, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+class BuildManifest:
+    # Inputs of generated sites of previous run, stored next to out directory
+    # Page entry: {'container_hash', 'template_version', 'masters', 'masters_hash', 'reviews', 'reviews_hash',
+    #   'online_links', 'local_links', 'page_hash'}
+    def __init__(self, out_directory):
+        self.path = os.path.normpath(out_directory) + MANIFEST_SUFFIX
+        self.pages = {}
+        # [i, N] if pages are shard i of N shards, None - all sites
+        self.shard = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.pages = data['pages']
+            self.shard = data.get('shard')
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get(self, url_path):
+        return self.pages.get(url_path)
+
+    # Replace pages of manifest by pages of current run
+    def set_pages(self, pages):
+        self.pages = pages
+
+    def save(self):
+        data = {'pages': self.pages}
+        if self.shard is not None:
+            data['shard'] = self.shard
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+# Log of written pages of checkpoint, every save appends pages added after previous save
+CHECKPOINT_PAGES_SUFFIX = '.checkpoint.pages.jsonl'
+# Seconds between checkpoints while pages are rendered
+CHECKPOINT_INTERVAL = 60
+# Pages waiting for save which make checkpoint due before interval, they are kept in memory until save
+CHECKPOINT_MAX_PAGES = 10000
+
+"""Phases of run"""
+RENDER_PHASE = 'render'         # Pages are written to staging output
+PUBLISHED_PHASE = 'published'   # Output and manifest are published, used reviews and report are left
+
+
+class Checkpoint:
+    # Progress of run stored next to out directory, interrupted run is resumed by it
+    # State: {'phase', 'shard', 'seeds': {'reviews', 'content'}}, pages log: json line [urlPath, manifest entry]
+    #   per site written to output
+    def __init__(self, out_directory, interval=CHECKPOINT_INTERVAL, max_pages=CHECKPOINT_MAX_PAGES):
+        self.path = os.path.normpath(out_directory) + CHECKPOINT_SUFFIX
+        self.pages_path = os.path.normpath(out_directory) + CHECKPOINT_PAGES_SUFFIX
+        self.interval = interval
+        self.max_pages = max_pages
+        self.phase = None
+        self.shard = None
+        self.seeds = {}
+        # Pages of interrupted run, dict {urlPath: manifest entry} loaded by load()
+        self.pages = {}
+        # Pages added after last save, list of [urlPath, manifest entry]
+        self.added = []
+        self.saved_time = time.monotonic()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if not self.exists():
+            raise Exception('No checkpoint to resume: ' + self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.phase = data['phase']
+        self.shard = data['shard']
+        self.seeds = data['seeds']
+        self.pages = self.load_pages()
+
+    # Read pages log, line of save interrupted by crash is cut off, so next saves append after the last page
+    def load_pages(self):
+        pages = {}
+        if not os.path.exists(self.pages_path):
+            return pages
+        with open(self.pages_path, 'rb+') as f:
+            position = 0
+            for line in f:
+                try:
+                    url_path, entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    line = b''
+                if not line.endswith(b'\n'):
+                    f.truncate(position)
+                    break
+                pages[url_path] = entry
+                position += len(line)
+        return pages
+
+    # Add page written to output, it is saved by next save
+    def add(self, url_path, entry):
+        self.added.append([url_path, entry])
+
+    # Save state, added pages are appended to pages log
+    def save(self, phase):
+        self.phase = phase
+        if len(self.added) > 0:
+            with open(self.pages_path, 'a', encoding='utf-8') as f:
+                for page in self.added:
+                    f.write(json.dumps(page, ensure_ascii=False) + '\n')
+            self.added = []
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'phase': self.phase, 'shard': self.shard, 'seeds': self.seeds}, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+        self.saved_time = time.monotonic()
+
+    # Return: True if interval passed since last save or too many pages wait for save
+    def due(self):
+        return time.monotonic() - self.saved_time >= self.interval or len(self.added) >= self.max_pages
+
+    def remove(self):
+        for path in [self.path, self.pages_path]:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,77 @@
+import hashlib
+import random
+
+import numpy as np
+from russian_names import RussianNames
+
+
+# Count of reviewer names drawn to pool once per run
+NAME_POOL_SIZE = 5000
+# Lesson lengths of master cards (minutes)
+TIME_SPACING = [45, 60]
+# Post dates of reviews
+REVIEW_DATES = (
+    'сегодня',
+    'вчера',
+    '2 дня назад',
+    '3 дня назад',
+    '4 дня назад',
+    '5 дней назад',
+    '6 дней назад',
+    '7 дней назад',
+    '10 дней назад',
+    '20 дней назад',
+    'больше месяца назад'
+)
+# Price range of page: [lowest, highest + 1] of hundreds and halves of minimal and maximal price, caps
+MIN_PRICE_HUNDREDS = [6, 9]
+MAX_PRICE_HUNDREDS = [12, 16]
+MIN_PRICE_CAP = 800
+MAX_PRICE_CAP = 1500
+REVIEW_COUNT_RANGE = [400, 2501]
+# Rating in tenths
+RATING_RANGE = [47, 51]
+
+
+class ContentPool:
+    # Random content of pages (reviewer names, review dates, lesson lengths, prices, ratings). Pools are built once
+    # per run, values of page depend only on seed and urlPath, so pages are repeatable across runs
+    # Accept: seed - seed of run, None - random seed
+    def __init__(self, seed=None, name_pool_size=NAME_POOL_SIZE):
+        self.seed = seed if seed is not None else random.getrandbits(64)
+
+        # Names generator use global random, its state is restored
+        state = random.getstate()
+        self.names = [person.split(' ')[0] for person in
+                      RussianNames(count=name_pool_size, patronymic=False, surname=False, seed=self.seed)]
+        random.setstate(state)
+
+    # Random generator of page
+    def get_rng(self, url_path):
+        digest = hashlib.sha1((str(self.seed) + '/' + url_path).encode('utf-8')).digest()
+        return np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+    # Draw all random values of page by one call
+    # Accept: url_path - urlPath of page, cards_count - count of master cards on page
+    # Return: dict {'reviewers', 'review_dates', 'minutes' - lists by card, 'price_range', 'review_count',
+    #   'rating_value'}
+    def draw_page(self, url_path, cards_count):
+        rng = self.get_rng(url_path)
+        values = rng.integers(
+            [0] * 3 * cards_count + [MIN_PRICE_HUNDREDS[0], 0, MAX_PRICE_HUNDREDS[0], 0, REVIEW_COUNT_RANGE[0],
+                                     RATING_RANGE[0]],
+            [len(self.names), len(REVIEW_DATES), len(TIME_SPACING)] * cards_count +
+            [MIN_PRICE_HUNDREDS[1], 2, MAX_PRICE_HUNDREDS[1], 2, REVIEW_COUNT_RANGE[1], RATING_RANGE[1]]).tolist()
+        cards = values[:3 * cards_count]
+        min_hundreds, min_half, max_hundreds, max_half, review_count, rating = values[3 * cards_count:]
+
+        min_price = min(min_hundreds * 100 + min_half * 50, MIN_PRICE_CAP)
+        max_price = min(max_hundreds * 100 + max_half * 50, MAX_PRICE_CAP)
+        return {
+            'reviewers': [self.names[i] for i in cards[0::3]],
+            'review_dates': [REVIEW_DATES[i] for i in cards[1::3]],
+            'minutes': [TIME_SPACING[i] for i in cards[2::3]],
+            'price_range': 'от ' + str(min_price) + ' до ' + str(max_price) + ' ₽',
+            'review_count': str(review_count),
+            'rating_value': str(rating / 10),
+        }
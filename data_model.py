@@ -0,0 +1,61 @@
+from build_manifest import hash_values
+
+
+class SiteDataModel:
+    # Read-only lookups over downloaded sheets, built once after downloading
+    # Accept: data frames of MasterData, MasterAbout, MasterEducation and SectionMaster sheets
+    def __init__(self, master_data_df, master_about_df, master_education_df, selection_master_df):
+        # MasterData rows by path, only paths present once in sheet are valid
+        self.masters = {}
+        path_counts = {}
+        for master_data in master_data_df.values:
+            path_counts[master_data[0]] = path_counts.get(master_data[0], 0) + 1
+            self.masters[master_data[0]] = master_data
+        for path, count in path_counts.items():
+            if count != 1:
+                del self.masters[path]
+
+        # About texts by master path sorted by id
+        about_rows = {}
+        for about_id, master, about_text in master_about_df[['id', 'masterDataId', 'aboutText']].values:
+            about_rows.setdefault(master, []).append([about_id, about_text])
+        self.master_about = {}
+        for master, rows in about_rows.items():
+            self.master_about[master] = [about_text for about_id, about_text in sorted(rows, key=lambda x: x[0])]
+
+        # Education texts by master path in sheet order
+        self.master_education = {}
+        for master, education in master_education_df[['masterDataId', 'education']].values:
+            self.master_education.setdefault(master, []).append(education)
+
+        # Valid master paths by sectionId in sheet order
+        self.section_masters = {}
+        for section_id, master in selection_master_df[['sectionId', 'pathMaster']].values:
+            masters = self.section_masters.setdefault(section_id, [])
+            if self.valid_master_path(master):
+                masters.append(master)
+
+    # If count masters with master_path equal 1 return True, else False
+    def valid_master_path(self, master_path):
+        return master_path in self.masters
+
+    # Return: row of MasterData of valid master
+    def get_master(self, master_path):
+        return self.masters[master_path]
+
+    # Return: list of about texts of master sorted by id
+    def get_about(self, master_path):
+        return self.master_about.get(master_path, [])
+
+    # Return: list of education texts of master
+    def get_education(self, master_path):
+        return self.master_education.get(master_path, [])
+
+    # Return: hash of all data of master shown on master card
+    def get_master_hash(self, master_path):
+        return hash_values(list(self.get_master(master_path)) + self.get_about(master_path) +
+                           self.get_education(master_path))
+
+    # Return: list of valid masters paths of section
+    def get_section_masters(self, section_id):
+        return self.section_masters.get(section_id, [])
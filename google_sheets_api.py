@@ -1,17 +1,25 @@
 import httplib2
-import time
 
 import apiclient.discovery
+from apiclient.errors import HttpError
 from oauth2client.service_account import ServiceAccountCredentials
 
+from rate_limiter import RateLimiter
+
+
+# Maximum count of cells in one values batchUpdate request, bigger updates are split
+MAX_UPDATE_CELLS = 40000
+
 
 class GoogleSheetsApi:
-    def __init__(self, token):
-        self.auth_service = None
-        self.request_count = 0
-        self.request_limit = 60
-        self.request_sleep = 200
-        self.authorization(token)
+    # Accept: token - authorisation token file, auth_service - ready sheets service (discovery client),
+    #   if set authorisation is skipped, drive_service - ready drive service, limiter - RateLimiter for all requests
+    def __init__(self, token, auth_service=None, limiter=None, drive_service=None):
+        self.auth_service = auth_service
+        self.drive_service = drive_service
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        if auth_service is None:
+            self.authorization(token)
 
 
     # Authorisation in serves google
@@ -19,40 +27,42 @@ class GoogleSheetsApi:
     def authorization(self, token):
         credentials = ServiceAccountCredentials.from_json_keyfile_name(
             token,
-            ['https://www.googleapis.com/auth/spreadsheets'])
+            ['https://www.googleapis.com/auth/spreadsheets',
+             'https://www.googleapis.com/auth/drive.metadata.readonly'])
         http_auth = credentials.authorize(httplib2.Http())
         self.auth_service = apiclient.discovery.build('sheets', 'v4', http=http_auth)
-        self.request_count += 1
+        self.drive_service = apiclient.discovery.build('drive', 'v3', http=http_auth)
 
     # Get data from document table_id, sheet list_name in range [start_range_point, end_range_point]
     # Return: mas with data with major_dimension (ROWS/COLUMNS)
     def get_data_from_sheets(self, table_id, list_name, start_range_point, end_range_point, major_dimension):
-        self.request_count += 1
-        if self.request_count >= self.request_limit:
-            self.request_count = 0
-            time.sleep(self.request_sleep)
-
-        values = self.auth_service.spreadsheets().values().get(
+        values = self.limiter.execute(self.auth_service.spreadsheets().values().get(
             spreadsheetId=table_id,
             range="'{0}'!{1}:{2}".format(list_name, start_range_point, end_range_point),
             majorDimension=major_dimension
-        ).execute()
+        ))
         if 'values' in values.keys():
             return values['values']
         else:
             return []
 
+    # Get data of many ranges from document table_id by one request
+    # Accept: ranges - list of [list_name, start_range_point, end_range_point], end_range_point can be open-ended
+    #   column ('O' - all rows from start_range_point to the end of sheet)
+    # Return: list of mas with data with major_dimension (ROWS/COLUMNS) in order of ranges
+    def get_data_from_sheets_batch(self, table_id, ranges, major_dimension):
+        response = self.limiter.execute(self.auth_service.spreadsheets().values().batchGet(
+            spreadsheetId=table_id,
+            ranges=["'{0}'!{1}:{2}".format(list_name, start_range_point, end_range_point)
+                    for list_name, start_range_point, end_range_point in ranges],
+            majorDimension=major_dimension
+        ))
+        return [value_range.get('values', []) for value_range in response.get('valueRanges', [])]
+
     # Put data to document table_id, sheet list_name in range [start_range_point, end_range_point]
     # in major_dimension (ROWS/COLUMNS)
     def put_data_to_sheets(self, table_id, list_name, start_range_point, end_range_point, major_dimension, data):
-        self.request_count += 1
-        print(self.request_count)
-        if self.request_count >= self.request_limit:
-            self.request_count = 0
-            print('sleep')
-            time.sleep(self.request_sleep)
-
-        values = self.auth_service.spreadsheets().values().batchUpdate(
+        self.limiter.execute(self.auth_service.spreadsheets().values().batchUpdate(
             spreadsheetId=table_id,
             body={
                 "valueInputOption": "USER_ENTERED",
@@ -61,7 +71,7 @@ class GoogleSheetsApi:
                     "majorDimension": major_dimension,
                     "values": data
                 }]
-            }).execute()
+            }))
 
     # Put data to document table_id, sheet list_name in column column(char) and range [start_row, start_row+len(data)]
     def put_column_to_sheets(self, table_id, list_name, column, start_row, data):
@@ -83,6 +93,65 @@ class GoogleSheetsApi:
             self.put_column_to_sheets(table_id, list_name, column, start_row+shift, packet)
             shift += packet_size
 
+    # Put many ranges to document table_id by as few values batchUpdate requests as possible,
+    # requests are split when count of cells exceeds max_cells
+    # Accept: ranges - list of [list_name, start_range_point, end_range_point, values], values in major_dimension
+    # Return: count of sent requests
+    def put_ranges_to_sheets(self, table_id, ranges, major_dimension, max_cells=MAX_UPDATE_CELLS):
+        requests_data = [[]]
+        cells_count = 0
+        for list_name, start_range_point, end_range_point, values in ranges:
+            range_cells = sum(len(value) for value in values)
+            if cells_count + range_cells > max_cells and len(requests_data[-1]) > 0:
+                requests_data.append([])
+                cells_count = 0
+            requests_data[-1].append({
+                "range": ("{0}!{1}:{2}".format(list_name, start_range_point, end_range_point)),
+                "majorDimension": major_dimension,
+                "values": values
+            })
+            cells_count += range_cells
+
+        requests_count = 0
+        for data in requests_data:
+            if len(data) == 0:
+                continue
+            self.limiter.execute(self.auth_service.spreadsheets().values().batchUpdate(
+                spreadsheetId=table_id,
+                body={
+                    "valueInputOption": "USER_ENTERED",
+                    "data": data
+                }))
+            requests_count += 1
+        return requests_count
+
+    # Put only changed cells of column column(char) to document table_id, sheet list_name,
+    # changed cells are merged to contiguous ranges and sent together
+    # Accept: old_data - column as it is in sheet, data - new column, both from start_row
+    # Return: count of sent requests
+    def put_column_changes_to_sheets(self, table_id, list_name, column, start_row, old_data, data,
+                                     max_cells=MAX_UPDATE_CELLS):
+        ranges = self.gen_column_changes_ranges(list_name, column, start_row, old_data, data, max_cells)
+        return self.put_ranges_to_sheets(table_id, ranges, 'ROWS', max_cells)
+
+    # Merge changed cells of column to contiguous ranges, range is not longer then max_cells
+    # Return: list of [list_name, start_range_point, end_range_point, values] for put_ranges_to_sheets
+    @staticmethod
+    def gen_column_changes_ranges(list_name, column, start_row, old_data, data, max_cells=MAX_UPDATE_CELLS):
+        ranges = []
+        i = 0
+        while i < len(data):
+            if i < len(old_data) and old_data[i] == data[i]:
+                i += 1
+                continue
+            end = i + 1
+            while end < len(data) and end - i < max_cells and (end >= len(old_data) or old_data[end] != data[end]):
+                end += 1
+            ranges.append([list_name, column + str(start_row + i), column + str(start_row + end - 1),
+                           [[value] for value in data[i:end]]])
+            i = end
+        return ranges
+
     # Put data to document table_id, sheet list_name in row column and
     # range [start_column(char), start_column+len(data)]
     def put_row_to_sheets(self, table_id, list_name, row, start_column, data):
@@ -93,11 +162,7 @@ class GoogleSheetsApi:
 
     # Get sheet_id of list_name in document table_id"""
     def get_sheet_id(self, table_id, list_name):
-        self.request_count += 1
-        if self.request_count >= self.request_limit:
-            self.request_count = 0
-            time.sleep(self.request_sleep)
-        spreadsheet = self.auth_service.spreadsheets().get(spreadsheetId=table_id).execute()
+        spreadsheet = self.limiter.execute(self.auth_service.spreadsheets().get(spreadsheetId=table_id))
         sheet_id = None
         for _sheet in spreadsheet['sheets']:
             if _sheet['properties']['title'] == list_name:
@@ -146,34 +211,36 @@ class GoogleSheetsApi:
 
     # Apply spreadsheets requests on document table_id
     def apply_spreadsheets_requests(self, table_id, requests):
-        self.request_count += 1
-        if self.request_count >= self.request_limit:
-            self.request_count = 0
-            time.sleep(self.request_sleep)
-        self.auth_service.spreadsheets().batchUpdate(
+        self.limiter.execute(self.auth_service.spreadsheets().batchUpdate(
             spreadsheetId=table_id,
-            body={"requests": [requests]}).execute()
+            body={"requests": [requests]}))
 
     # Clear sheet list_name in document table_id
     def clear_sheet(self, table_id, list_name):
-        self.request_count += 1
-        if self.request_count >= self.request_limit:
-            self.request_count = 0
-            time.sleep(self.request_sleep)
         range_all = '{0}!A1:Z'.format(list_name)
-        self.auth_service.spreadsheets().values().clear(spreadsheetId=table_id, range=range_all, body={}).execute()
+        self.limiter.execute(self.auth_service.spreadsheets().values().clear(spreadsheetId=table_id, range=range_all,
+                                                                             body={}))
 
     # Get sizes of sheet list_name in document table_id"""
     # Return [column_count, row_count]
     def get_list_size(self, table_id, list_name):
-        self.request_count += 1
-        if self.request_count >= self.request_limit:
-            self.request_count = 0
-            time.sleep(self.request_sleep)
-        request = self.auth_service.spreadsheets().get(spreadsheetId=table_id, ranges=list_name).execute()
+        request = self.limiter.execute(self.auth_service.spreadsheets().get(spreadsheetId=table_id, ranges=list_name))
         return [request['sheets'][0]['properties']['gridProperties']['columnCount'],
                 request['sheets'][0]['properties']['gridProperties']['rowCount']]
 
+    # Get time of last change of document table_id (drive metadata)
+    # Return: str modified time in RFC 3339, None - metadata isn't available (no drive service, drive api is
+    #   disabled or token has no drive.metadata.readonly scope)
+    def get_modified_time(self, table_id):
+        if self.drive_service is None:
+            return None
+        try:
+            request = self.limiter.execute(self.drive_service.files().get(fileId=table_id, fields='modifiedTime'))
+        except HttpError as e:
+            print('Modified time of document is not available:', e)
+            return None
+        return request['modifiedTime']
+
     # Convert char column_index to int
     # Accept: char column_index
     # Return: int column_index
@@ -0,0 +1,81 @@
+import re
+
+
+# Tags which content is kept as is
+RAW_TAGS = ('pre', 'textarea', 'script', 'style')
+# Whitespace next to these tags isn't shown, it is removed
+BLOCK_TAGS = {
+    '!doctype', 'html', 'head', 'body', 'title', 'meta', 'link', 'base', 'script', 'style', 'noscript',
+    'address', 'article', 'aside', 'blockquote', 'details', 'dialog', 'dd', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main',
+    'nav', 'ol', 'p', 'pre', 'section', 'summary', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+    'option', 'select', 'textarea', 'iframe', 'svg', 'source', 'picture', 'video', 'audio',
+}
+
+# Html void tags, '/' of self closing form isn't needed
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# Raw tag with content, comment or tag
+TOKEN_RE = re.compile(r'(<(' + '|'.join(RAW_TAGS) + r')\b[^>]*>.*?</\2\s*>)|(<!--.*?-->)|(<[!/]?[a-zA-Z][^<>]*>)',
+                      re.S | re.I)
+TAG_NAME_RE = re.compile(r'</?([!a-zA-Z][a-zA-Z0-9]*)')
+# Quoted attribute value without chars which need quotes (and without slot marks of page_template),
+# value before '/' of self closing tag keeps quotes
+QUOTED_ATTRIBUTE_RE = re.compile('(\\s[^\\s=<>"\']+)="([^\\s"\'=<>`\ue000\ue001]+)"(?!/)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+# Minify html: remove comments (except conditional), whitespace between block tags and quotes of simple
+# attribute values, collapse whitespace of text. Content of pre, textarea, script and style isn't changed
+# Return: minified html
+def minify_html(text):
+    # Tokens [kind, text, tag name]
+    tokens = []
+    position = 0
+    for match in TOKEN_RE.finditer(text):
+        if match.start() > position:
+            append_text(tokens, text[position:match.start()])
+        position = match.end()
+
+        if match.group(1) is not None:
+            tokens.append(['raw', match.group(1), match.group(2).lower()])
+        elif match.group(3) is not None:
+            if match.group(3).startswith('<!--[if'):
+                tokens.append(['raw', match.group(3), None])
+        else:
+            tag = match.group(4)
+            name = TAG_NAME_RE.match(tag).group(1).lower()
+            if name in VOID_TAGS and tag.endswith('/>'):
+                tag = tag[:-2].rstrip() + '>'
+            tokens.append(['tag', QUOTED_ATTRIBUTE_RE.sub(unquote_attribute, tag), name])
+    if position < len(text):
+        append_text(tokens, text[position:])
+
+    result = []
+    for i, (kind, token_text, name) in enumerate(tokens):
+        if kind != 'text':
+            result.append(token_text)
+            continue
+
+        if token_text.strip() == '':
+            previous_name = tokens[i - 1][2] if i > 0 else '!doctype'
+            next_name = tokens[i + 1][2] if i + 1 < len(tokens) else '!doctype'
+            if previous_name in BLOCK_TAGS or next_name in BLOCK_TAGS:
+                continue
+        result.append(WHITESPACE_RE.sub(' ', token_text))
+    return ''.join(result)
+
+
+# Add text token, text next to removed comment is joined
+def append_text(tokens, text):
+    if len(tokens) > 0 and tokens[-1][0] == 'text':
+        tokens[-1][1] += text
+    else:
+        tokens.append(['text', text, None])
+
+
+# Value ending with '/' keeps quotes, it would close void tag
+def unquote_attribute(match):
+    if match.group(2).endswith('/'):
+        return match.group(0)
+    return match.group(1) + '=' + match.group(2)
@@ -0,0 +1,59 @@
+import random
+
+
+# Count of links in every links block of page
+LINKS_COUNT = 10
+
+
+class LinkPools:
+    # Pools of sites for links blocks, built once for all pages
+    # Accept: sites - rows (or iterator of rows) of Container of sites which will be generated
+    def __init__(self, sites, links_count=LINKS_COUNT):
+        self.links_count = links_count
+        self.online = []
+        self.local = []
+        for site in sites:
+            if site[1] == 'online':
+                self.online.append([site[2], site[3]])
+            else:
+                self.local.append([site[2], site[3]])
+        self.online_names = dict(self.online)
+        self.local_names = dict(self.local)
+
+    # Return: True if site is in pools
+    def has_site(self, url_path):
+        return url_path in self.online_names or url_path in self.local_names
+
+    # Get links of site to other sites
+    # Return: [online links, local links], link - [urlPath, name]
+    def get_links(self, site):
+        return self.sample(self.online, site[2]), self.sample(self.local, site[2])
+
+    # Random links_count sites of pool except url_path, without copying of pool:
+    # sample one site more and drop url_path (or the last one if url_path not sampled)
+    def sample(self, pool, url_path):
+        if len(pool) <= self.links_count + 1:
+            links = [link for link in pool if link[0] != url_path]
+            if len(links) > self.links_count:
+                links = random.sample(links, self.links_count)
+            return links
+
+        links = random.sample(pool, self.links_count + 1)
+        return [link for link in links if link[0] != url_path][:self.links_count]
+
+    # Check links of previous run: all linked sites are still in pools with same names and count of links
+    # is the same as new sample would have
+    # Accept: links - [online links, local links]
+    def valid_links(self, site, links):
+        online_links, local_links = links
+        return self.valid_pool_links(self.online_names, online_links, site[2]) and \
+            self.valid_pool_links(self.local_names, local_links, site[2])
+
+    def valid_pool_links(self, names, links, url_path):
+        others_count = len(names) - (1 if url_path in names else 0)
+        if len(links) != min(self.links_count, others_count):
+            return False
+        for link_path, name in links:
+            if link_path == url_path or names.get(link_path) != name:
+                return False
+        return True
@@ -1,14 +1,49 @@
-from sites_generator import SitesGenerator
+import argparse
+
+from sites_generator import SitesGenerator, OUT_DIRECTORY, SITE_URL, SNAPSHOT_DIRECTORY
+from sharding import parse_shard
+from site_batch import SiteBatch, load_batch_config
 from multiprocessing import freeze_support
 
 """Options"""
 TOKEN_FILE = 'google_token.json'                                    # File with google service auth token.
 TABLE_ID = '1mZb-JiEzSSqyxXsQeuo1NpentUqDSJLkzDkgqLE3Vy4'    # ID Google Sheets document
 REVIEWS_CSV_FILE = 'goods.csv'                               # Path/name.csv of goods file
-OUT_DIRECTORY = 'D:\\#sites\\'                                # Path of output directory
+INCREMENTAL = True                                           # Render only changed sites (manifest near OUT_DIRECTORY)
+OFFLINE = False                                              # Use last snapshot without google requests, no report
+SHARD = None                                                 # Shard 'i/N' of containers of this host, 0 <= i < N
+MERGED_DIRECTORY = None                                      # Out directory of merge of shards, for incremental shard
 
 if __name__ == '__main__':
     freeze_support()
-    generator = SitesGenerator(REVIEWS_CSV_FILE)
-    generator.download_data(TOKEN_FILE, TABLE_ID)
-    generator.gen_sites(TOKEN_FILE, TABLE_ID, OUT_DIRECTORY)
+    parser = argparse.ArgumentParser(description='Generate sites by google sheets document')
+    parser.add_argument('--shard', default=SHARD,
+                        help='generate only shard i/N of containers (0 <= i < N), shards must use the same snapshot')
+    parser.add_argument('--merged', default=MERGED_DIRECTORY, metavar='MERGED_OUT_DIRECTORY',
+                        help='out directory of previous --merge, its manifest gives previous pages of all shards to '
+                             'incremental shard')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue interrupted run from its checkpoint, written pages are not rendered again')
+    parser.add_argument('--merge', nargs='+', metavar='SHARD_OUT_DIRECTORY',
+                        help='merge shards by their manifests: check links, write sitemap to OUT_DIRECTORY and '
+                             'mark added sites')
+    parser.add_argument('--batch', metavar='CONFIG_FILE',
+                        help='generate sites of json config {"sites": [{"table_id", "reviews_csv_file", '
+                             '"out_directory", "site_url", "incremental", "template_directory", "metrics_file"}]} '
+                             'by one pool of workers')
+    args = parser.parse_args()
+
+    if args.batch:
+        if args.shard or args.merge:
+            parser.error('--batch can\'t be used with --shard or --merge')
+        batch = SiteBatch(load_batch_config(args.batch))
+        batch.download_data(TOKEN_FILE, SNAPSHOT_DIRECTORY, OFFLINE)
+        batch.gen_sites(TOKEN_FILE, args.resume)
+    else:
+        generator = SitesGenerator(REVIEWS_CSV_FILE)
+        generator.download_data(TOKEN_FILE, TABLE_ID, SNAPSHOT_DIRECTORY, OFFLINE)
+        if args.merge:
+            generator.merge_shards(TOKEN_FILE, TABLE_ID, args.merge, OUT_DIRECTORY, SITE_URL)
+        else:
+            generator.gen_sites(TOKEN_FILE, TABLE_ID, OUT_DIRECTORY, SITE_URL, INCREMENTAL,
+                                parse_shard(args.shard) if args.shard else None, args.resume, args.merged)
@@ -0,0 +1,128 @@
+from bs4 import BeautifulSoup
+
+from page_template import PageTemplate, SLOT_MARK, unescape_brackets, escape_text, escape_raw
+
+
+# Age groups of master: [index in MasterData row, caption]
+CHARACTERISTICS = [
+    [9, 'Дошкольники'],
+    [10, 'Начальные классы'],
+    [11, '5-9 классы'],
+    [12, '10-11 классы'],
+    [13, 'Студенты'],
+    [14, 'Взрослые'],
+]
+
+# Slots of master card which change from page to page: [name, escape function]
+CARD_SLOTS = [
+    ['review', escape_text],
+    ['reviewer', escape_text],
+    ['minutes', escape_text],
+    ['num', escape_raw],
+    ['num', escape_raw],
+    ['num', escape_raw],
+    ['num', escape_raw],
+]
+
+
+class MasterCardRenderer:
+    # Accept: template_file - path of master item html template, minify - minify static parts of cards
+    def __init__(self, template_file, minify=False):
+        with open(template_file, 'r', encoding='utf-8') as f:
+            self.template_text = f.read()
+        self.minify = minify
+        self.cards = {}
+
+    # Get compiled card of master
+    # Accept: key - key of card, hash of master data
+    # Return: PageTemplate or None if card of master isn't compiled
+    def get(self, key):
+        return self.cards.get(key)
+
+    # Fill static part of master card (once per run) and cache it by key
+    # Accept: key - hash of master data, same masters of several sites share card, master_data - row of MasterData,
+    #   master_about - list of about texts sorted by id, master_education - list of education texts
+    # Return: PageTemplate with CARD_SLOTS
+    def compile(self, key, master_data, master_about, master_education):
+        master_item = BeautifulSoup(self.template_text, "html.parser")
+        marks = [SLOT_MARK.format(i) for i in range(len(CARD_SLOTS))]
+
+        # Info
+        avatar_src = 'master/' + master_data[2]
+        if avatar_src.split('.')[-1] != 'svg':
+            avatar_src += '.jpg'
+        master_item.find('div', {'data-mark': 'MasterData.logoPath'}).find('img').attrs['src'] = avatar_src
+        master_item.find('h4', {'data-mark': 'MasterData.initials'}).string.replace_with(master_data[1])
+        master_item.find('div', {'data-mark': 'MasterData.rate'}).find('span').string.replace_with(master_data[3])
+        master_item.find('span', {'data-mark': 'MasterData.amount_reviews'})\
+            .string.replace_with('Отзывы: ' + master_data[4])
+        master_item.find('div', {'data-mark': 'MasterData.amount_lessons'}) \
+            .string.replace_with('Уроки: ' + master_data[5])
+
+        # Reviews
+        master_item.find('p', {'data-mark': 'ReviewData.review'}).string.replace_with(marks[0])
+        master_item.find('div', {'data-mark': 'ReviewData.review_customerName_date'}).string = marks[1]
+
+        # About
+        about_block = master_item.find('div', {'data-mark': 'MasterAbout.aboutText'}).parent
+        about_block.div.p.decompose()
+        if len(master_about) > 0:
+            for i in range(len(master_about)):
+                new_tag = master_item.new_tag('p')
+                about_block.div.insert(i, new_tag)
+                about_block.find_all('p')[-1].attrs['class'] = 'hide-item'
+                about_block.find_all('p')[-1].string = master_about[i]
+        else:
+            about_block.decompose()
+
+        # Education
+        education_block = master_item.find('div', {'data-mark': 'MasterEducation.education'}).parent
+        education_block.div.p.decompose()
+        if len(master_education) > 0:
+            for i in range(len(master_education)):
+                new_tag = master_item.new_tag('p')
+                education_block.div.insert(i, new_tag)
+                education_block.find_all('p')[-1].attrs['class'] = 'hide-item'
+                education_block.find_all('p')[-1].string = master_education[i]
+        else:
+            education_block.decompose()
+
+        # Price, work_online, consultation
+        master_item.find('div', {'data-mark': 'MasterData.cost_time'})\
+            .string = "<span>" + master_data[6] + " ₽</span> / " + marks[2] + " мин"
+        if not master_data[7]:
+            master_item.find('div', {'data-mark': 'MasterData.work_online'}).decompose()
+        if not master_data[8]:
+            master_item.find('div', {'data-mark': 'MasterData.consultation'}).decompose()
+
+        # Characteristic
+        characteristic_block = master_item.find('div', {'data-mark': 'MasterData.characteristic'}).ul
+        characteristic_block.li.decompose()
+        for index, caption in CHARACTERISTICS:
+            if master_data[index]:
+                new_tag = master_item.new_tag('li')
+                characteristic_block.append(new_tag)
+                characteristic_block.find_all('li')[-1].string = caption
+
+        # Paste nums
+        master_item.find('div', {'class': 'master__left _master-1'})['class'] = 'master__left _master-' + marks[3]
+        master_item.find('div', {'class': 'spollers _spollers-1'})['class'] = 'spollers _spollers-' + marks[4]
+        master_item.find('div', {'data-da': '_master-1,1,991'})['data-da'] = '_master-' + marks[5] + ',1,991'
+        master_item.find('div', {'data-da': '_spollers-1,2,991'})['data-da'] = '_spollers-' + marks[6] + ',2,991'
+
+        card = PageTemplate.from_text(unescape_brackets(str(master_item)), CARD_SLOTS, self.minify)
+        self.cards[key] = card
+        return card
+
+    # Render master card for page
+    # Accept: card - compiled card of master, review - review text, reviewer - reviewer name,
+    #   review_date - text of review date, minutes - lesson length, num - index of master on page
+    # Return: html of master card
+    @staticmethod
+    def render(card, review, reviewer, review_date, minutes, num):
+        return card.render({
+            'review': review,
+            'reviewer': '{0} <span>{1}</span>'.format(reviewer, review_date),
+            'minutes': str(minutes),
+            'num': str(num + 1),
+        })
@@ -0,0 +1,150 @@
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds of buckets of latency histograms (seconds)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+METRICS_PREFIX = 'sites_generator'
+
+
+class Histogram:
+    # Cumulative histogram in format of prometheus
+    # Accept: buckets - sorted upper bounds of buckets
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    # Return: list of [upper bound, count of values <= upper bound], last bound is '+Inf'
+    def cumulative(self):
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            total += count
+            result.append([bound, total])
+        return result
+
+
+class RunMetrics:
+    # Timings of stages, counters and histograms of one run
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.histograms = {}
+
+    # Time block of code as stage name, repeated stages are summed
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    # Add dict of counters, names are prefixed by prefix
+    def count_values(self, prefix, values):
+        for name, value in values.items():
+            self.count(prefix + '.' + name, value)
+
+    def observe(self, name, value):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(value)
+
+    # Add timings and sizes of page rendered by worker
+    # Accept: timings - dict {name: seconds}, sizes - dict {'page', 'minify_saved'} (bytes) of render_site
+    def add_page(self, timings, sizes=None):
+        for name, seconds in timings.items():
+            self.add_time('page.' + name, seconds)
+        self.observe('page_render_seconds', timings['total'])
+        self.count('pages')
+        if sizes:
+            self.count('page_bytes', sizes['page'])
+            self.count('page_bytes_before_minify', sizes['page'] + sizes['minify_saved'])
+
+    # Print stages sorted by time
+    def print_summary(self):
+        for name, seconds in sorted(self.stages.items(), key=lambda x: -x[1]):
+            print('{0:<28} {1:>10.3f} s'.format(name, seconds))
+
+    # Return: dict {'stages', 'counters', 'histograms'} of run
+    def to_dict(self):
+        return {
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+            'histograms': {name: {'sum': histogram.sum, 'count': histogram.count, 'buckets': histogram.cumulative()}
+                           for name, histogram in self.histograms.items()},
+        }
+
+    # Write run report, format by extension: .prom - prometheus textfile, other - JSON lines
+    def write(self, file_name):
+        if file_name.endswith('.prom'):
+            text = self.gen_prometheus()
+        else:
+            text = self.gen_json_lines()
+        with open(file_name + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(file_name + '.tmp', file_name)
+
+    # One JSON object per stage, counter and histogram
+    def gen_json_lines(self):
+        now = time.time()
+        lines = []
+        for name, seconds in self.stages.items():
+            lines.append({'time': now, 'type': 'stage', 'name': name, 'seconds': seconds})
+        for name, value in self.counters.items():
+            lines.append({'time': now, 'type': 'counter', 'name': name, 'value': value})
+        for name, histogram in self.histograms.items():
+            lines.append({'time': now, 'type': 'histogram', 'name': name, 'sum': histogram.sum,
+                          'count': histogram.count, 'buckets': histogram.cumulative()})
+        return ''.join(json.dumps(line) + '\n' for line in lines)
+
+    def gen_prometheus(self):
+        lines = ['# TYPE {0}_stage_seconds gauge'.format(METRICS_PREFIX)]
+        for name, seconds in self.stages.items():
+            lines.append('{0}_stage_seconds{{stage="{1}"}} {2}'.format(METRICS_PREFIX, name, seconds))
+        for name, value in self.counters.items():
+            metric = METRICS_PREFIX + '_' + name.replace('.', '_')
+            lines.append('# TYPE {0} gauge'.format(metric))
+            lines.append('{0} {1}'.format(metric, value))
+        for name, histogram in self.histograms.items():
+            metric = METRICS_PREFIX + '_' + name
+            lines.append('# TYPE {0} histogram'.format(metric))
+            for bound, count in histogram.cumulative():
+                lines.append('{0}_bucket{{le="{1}"}} {2}'.format(metric, bound, count))
+            lines.append('{0}_sum {1}'.format(metric, histogram.sum))
+            lines.append('{0}_count {1}'.format(metric, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+# Profile block of code by cProfile if file_name is set, stats are saved to file_name
+@contextmanager
+def profile(file_name):
+    if file_name is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(file_name)
@@ -0,0 +1,265 @@
+import io
+import json
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+
+# Pages written by one batch of writer thread
+WRITE_BATCH_SIZE = 64
+# Pages waiting for writing, render results wait when queue is full
+WRITE_QUEUE_SIZE = 1024
+STAGING_SUFFIX = '.staging'
+PUBLISH_JOURNAL_SUFFIX = '.publish.json'
+TAR_EXTENSIONS = {'.tar': 'w', '.tar.gz': 'w:gz', '.tgz': 'w:gz', '.tar.bz2': 'w:bz2', '.tar.xz': 'w:xz'}
+ZIP_EXTENSIONS = ['.zip']
+
+
+# Output by path: archive for .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz, .zip, else directory
+# Accept: resume - continue writing to staging directory of interrupted run (directory only)
+def open_output(path, batch_size=WRITE_BATCH_SIZE, queue_size=WRITE_QUEUE_SIZE, resume=False):
+    if get_archive_extension(path) is not None:
+        if resume:
+            raise Exception('Resume is not supported for archive output ' + path)
+        return ArchiveOutput(path, batch_size, queue_size)
+    return DirectoryOutput(path, batch_size, queue_size, resume)
+
+
+# Return: archive extension of path or None
+def get_archive_extension(path):
+    for extension in list(TAR_EXTENSIONS) + ZIP_EXTENSIONS:
+        if path.lower().endswith(extension):
+            return extension
+    return None
+
+
+class OutputWriter:
+    # Files are given to background thread and written by batches, result is published by close()
+    # Accept: batch_size - files written by one batch, queue_size - files waiting for writing
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, queue_size=WRITE_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.closed = False
+        self.stats = {'files': 0, 'bytes': 0, 'batches': 0, 'write_time': 0.0}
+        # Directory for files written not by writer (sitemap), they are published with pages
+        self.directory = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    # Give file to writer thread
+    # Accept: name - path relative to output with '/' separators, data - bytes or str
+    def write(self, name, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put([name, data.encode('utf-8') if isinstance(data, str) else data])
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            files = [item for item in batch if item is not None]
+            if self.error is None and len(files) > 0:
+                start = time.perf_counter()
+                try:
+                    self.write_batch(files)
+                except Exception as e:
+                    self.error = e
+                self.stats['write_time'] += time.perf_counter() - start
+                self.stats['files'] += len(files)
+                self.stats['bytes'] += sum(len(data) for name, data in files)
+                self.stats['batches'] += 1
+            for item in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    # Wait until all given files are written
+    def flush(self):
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    # Wait until all given files are written and stop writer thread
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    # Write all files and publish output
+    def close(self):
+        self.stop()
+        if self.error is not None:
+            self.abort()
+            raise self.error
+        self.publish()
+        self.closed = True
+
+    # Stop writing, written files aren't published
+    def abort(self):
+        if self.closed:
+            return
+        self.stop()
+        self.discard()
+        self.closed = True
+
+    def write_batch(self, files):
+        raise NotImplementedError
+
+    def publish(self):
+        raise NotImplementedError
+
+    def discard(self):
+        raise NotImplementedError
+
+    # Return: True if file name is in output (written by previous run or by this run)
+    def exists(self, name):
+        return False
+
+    # Remove file of previous run from output on publish
+    def remove(self, name):
+        pass
+
+    # Return: names of files and directories in top directory of published output
+    def list_published(self):
+        return []
+
+
+class DirectoryOutput(OutputWriter):
+    # Only files written by run are written to staging directory, files of previous runs stay in out_directory.
+    # On publish staged files are moved to out_directory and removed files are deleted by journal, publish
+    # interrupted by crash is finished by next run
+    # Accept: resume - keep staging directory of interrupted run with its written files
+    def __init__(self, out_directory, batch_size=WRITE_BATCH_SIZE, queue_size=WRITE_QUEUE_SIZE, resume=False):
+        super().__init__(batch_size, queue_size)
+        self.out_directory = os.path.normpath(out_directory)
+        self.staging_directory = self.out_directory + STAGING_SUFFIX
+        self.journal_file = self.out_directory + PUBLISH_JOURNAL_SUFFIX
+        # Names of files removed on publish
+        self.removed = set()
+
+        # Run crashed while publishing
+        if os.path.exists(self.journal_file):
+            self.finish_publish()
+        # Staging directory of crashed run, kept on resume
+        if os.path.exists(self.staging_directory) and not resume:
+            shutil.rmtree(self.staging_directory)
+        os.makedirs(self.staging_directory, exist_ok=True)
+        self.directory = self.staging_directory
+        self.start()
+
+    def write(self, name, data):
+        self.removed.discard(name)
+        super().write(name, data)
+
+    def write_batch(self, files):
+        for name, data in files:
+            path = os.path.join(self.staging_directory, *name.split('/'))
+            if '/' in name:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+
+    def remove(self, name):
+        self.removed.add(name)
+
+    # Journal of removed files is written before files are moved, it commits publish
+    def publish(self):
+        for name in self.removed:
+            path = os.path.join(self.staging_directory, *name.split('/'))
+            if os.path.exists(path):
+                os.remove(path)
+        with open(self.journal_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'removed': sorted(self.removed)}, f, ensure_ascii=False)
+        os.replace(self.journal_file + '.tmp', self.journal_file)
+        self.finish_publish()
+
+    # Move staged files to out_directory and remove removed files, can be repeated after crash
+    def finish_publish(self):
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            removed = json.load(f)['removed']
+        os.makedirs(self.out_directory, exist_ok=True)
+        for root, directories, file_names in os.walk(self.staging_directory):
+            target_root = os.path.join(self.out_directory, os.path.relpath(root, self.staging_directory))
+            os.makedirs(target_root, exist_ok=True)
+            for file_name in file_names:
+                # Not finished write of crashed run
+                if not file_name.endswith('.tmp'):
+                    os.replace(os.path.join(root, file_name), os.path.join(target_root, file_name))
+        for name in removed:
+            path = os.path.join(self.out_directory, *name.split('/'))
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(self.staging_directory, ignore_errors=True)
+        os.remove(self.journal_file)
+
+    # Staging directory is kept for resume, it is removed by next not resumed run
+    def discard(self):
+        pass
+
+    def list_published(self):
+        return os.listdir(self.out_directory) if os.path.exists(self.out_directory) else []
+
+    def exists(self, name):
+        if name in self.removed:
+            return False
+        return os.path.exists(os.path.join(self.staging_directory, *name.split('/'))) or \
+            os.path.exists(os.path.join(self.out_directory, *name.split('/')))
+
+
+class ArchiveOutput(OutputWriter):
+    # Files are written to tar or zip archive (temporary file replaces archive_file on publish),
+    # files of directory are added to archive on publish
+    def __init__(self, archive_file, batch_size=WRITE_BATCH_SIZE, queue_size=WRITE_QUEUE_SIZE):
+        super().__init__(batch_size, queue_size)
+        self.archive_file = archive_file
+        self.temp_file = archive_file + '.tmp'
+        extension = get_archive_extension(archive_file)
+        if extension in TAR_EXTENSIONS:
+            self.archive = tarfile.open(self.temp_file, TAR_EXTENSIONS[extension])
+        else:
+            self.archive = zipfile.ZipFile(self.temp_file, 'w', zipfile.ZIP_DEFLATED)
+        self.directory = tempfile.mkdtemp()
+        self.start()
+
+    def write_batch(self, files):
+        for name, data in files:
+            self.add(name, data)
+
+    def add(self, name, data):
+        if isinstance(self.archive, tarfile.TarFile):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+        else:
+            self.archive.writestr(name, data)
+
+    def publish(self):
+        for root, directories, file_names in os.walk(self.directory):
+            for file_name in sorted(file_names):
+                path = os.path.join(root, file_name)
+                with open(path, 'rb') as f:
+                    self.add(os.path.relpath(path, self.directory).replace(os.sep, '/'), f.read())
+        self.archive.close()
+        os.replace(self.temp_file, self.archive_file)
+        shutil.rmtree(self.directory)
+
+    def discard(self):
+        self.archive.close()
+        if os.path.exists(self.temp_file):
+            os.remove(self.temp_file)
+        shutil.rmtree(self.directory, ignore_errors=True)
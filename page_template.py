@@ -0,0 +1,143 @@
+import re
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+
+from html_minify import minify_html
+
+
+"""Slot kinds"""
+STRING_SLOT = 'string'          # Value replaces contents of the tag
+ATTRIBUTE_SLOT = 'attribute'    # Value replaces value of the tag attribute
+INSERT_SLOT = 'insert'          # Value is inserted before the first child of the tag
+APPEND_SLOT = 'append'          # Value is appended after the last child of the tag
+APPEND_HTML_SLOT = 'append_html'    # Ready html is appended after the last child of the tag
+
+# Tags which text bs4 outputs without entity substitution
+CDATA_TAGS = ('script', 'style')
+
+# Private use chars, they never appear in template or in sheets data
+SLOT_MARK = '\ue000{0}\ue001'
+SLOT_MARK_RE = re.compile('\ue000(\\d+)\ue001')
+
+
+# Undo escaping of brackets in serialized soup (as bs4 escape html which put in text of tags)
+def unescape_brackets(text):
+    return text.replace('&lt;', '<').replace('&gt;', '>')
+
+
+# Escape text of tag, equal to bs4 substitution with unescaped brackets
+def escape_text(value):
+    return value.replace('&', '&amp;')
+
+
+# Text of script/style tags, bs4 output it as is
+def escape_cdata(value):
+    return unescape_brackets(value)
+
+
+# Quoted attribute value, equal to bs4 attribute output with unescaped brackets
+def escape_attribute(value):
+    return EntitySubstitution.quoted_attribute_value(value.replace('&', '&amp;'))
+
+
+# Text for ready html, all special chars escaped
+def escape_html_text(value):
+    return EntitySubstitution.substitute_xml(value)
+
+
+# Quoted attribute value for ready html, all special chars escaped
+def escape_html_attribute(value):
+    return EntitySubstitution.quoted_attribute_value(EntitySubstitution.substitute_xml(value))
+
+
+# Text of tag as is, used for values which never need escaping (numbers, ready html)
+def escape_raw(value):
+    return value
+
+
+# Find tag with data-mark attribute, used as slot locator
+def mark(data_mark):
+    return lambda soup: soup.find(attrs={'data-mark': data_mark})
+
+
+# Put slot marks to soup by slots
+# Accept: soup of template, slots - list of [name, locator, kind, attribute], locator get soup and return tag of slot,
+#   attribute used only by ATTRIBUTE_SLOT
+# Return: list of [name, escape function] with indexes of slot marks
+def mark_slots(soup, slots):
+    slot_escapes = []
+    for i, (name, locator, kind, attribute) in enumerate(slots):
+        tag = locator(soup)
+        slot_mark = SLOT_MARK.format(i)
+        if kind == ATTRIBUTE_SLOT:
+            tag.attrs[attribute] = slot_mark
+            slot_escapes.append([name, escape_attribute])
+            continue
+
+        if kind == STRING_SLOT:
+            tag.string = slot_mark
+        elif kind == INSERT_SLOT:
+            tag.insert(0, slot_mark)
+        elif kind == APPEND_SLOT:
+            tag.append(slot_mark)
+        elif kind == APPEND_HTML_SLOT:
+            tag.append(slot_mark)
+            slot_escapes.append([name, escape_raw])
+            continue
+        else:
+            raise Exception('Unknown slot kind: ' + str(kind))
+        slot_escapes.append([name, escape_cdata if tag.name in CDATA_TAGS else escape_text])
+
+    return slot_escapes
+
+
+class PageTemplate:
+    # Accept: fragments - static parts of page, slots - list of [name, escape function] between fragments,
+    #   len(fragments) == len(slots) + 1, saved_bytes - size of static parts removed by minification
+    def __init__(self, fragments, slots, saved_bytes=0):
+        self.fragments = fragments
+        self.slots = slots
+        self.saved_bytes = saved_bytes
+
+    # Compile html template file to list of static fragments and slots between them
+    # Accept: template_file - path of html template, slots - look mark_slots, minify - minify static parts
+    @classmethod
+    def load(cls, template_file, slots, minify=False):
+        with open(template_file, 'r', encoding='utf-8') as f:
+            template_text = f.read()
+        soup = BeautifulSoup(template_text, "html.parser")
+        slot_escapes = mark_slots(soup, slots)
+
+        site_text = unescape_brackets(str(soup))
+        for i, (name, locator, kind, attribute) in enumerate(slots):
+            if kind == ATTRIBUTE_SLOT:
+                site_text = site_text.replace('"' + SLOT_MARK.format(i) + '"', SLOT_MARK.format(i))
+
+        return cls.from_text(site_text, slot_escapes, minify)
+
+    # Split text with slot marks to fragments, static parts are minified once here instead of every page
+    # Accept: text - serialized template, slot_escapes - list of [name, escape function] with indexes of slot marks
+    @classmethod
+    def from_text(cls, text, slot_escapes, minify=False):
+        saved_bytes = 0
+        if minify:
+            minified_text = minify_html(text)
+            saved_bytes = len(text.encode('utf-8')) - len(minified_text.encode('utf-8'))
+            text = minified_text
+        parts = SLOT_MARK_RE.split(text)
+        slots = [slot_escapes[int(i)] for i in parts[1::2]]
+        if len(slots) != len(slot_escapes):
+            raise Exception('Template slots not found in serialized template')
+
+        return cls(parts[0::2], slots, saved_bytes)
+
+    # Render page
+    # Accept: values - dict {slot name: str}
+    # Return: page text
+    def render(self, values):
+        parts = [self.fragments[0]]
+        for i, (name, escape) in enumerate(self.slots):
+            parts.append(escape(values[name]))
+            parts.append(self.fragments[i + 1])
+        return ''.join(parts)
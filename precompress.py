@@ -0,0 +1,52 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# File extension of precompressed variant by encoding
+ENCODING_EXTENSIONS = {'gz': '.gz', 'br': '.br'}
+
+
+# Check that encodings of precompress settings are supported
+# Accept: precompress - list of [encoding, level]
+def check_encodings(precompress):
+    for encoding, level in precompress:
+        if encoding not in ENCODING_EXTENSIONS:
+            raise Exception('Unknown precompress encoding ' + str(encoding))
+        if encoding == 'br' and brotli is None:
+            raise Exception('Package brotli is needed for br precompress')
+
+
+# Return: list of extensions of variants ('.gz', '.br')
+def get_extensions(precompress):
+    return [ENCODING_EXTENSIONS[encoding] for encoding, level in precompress]
+
+
+# Compress data, equal data gives equal result (gzip header has no time)
+def compress(data, encoding, level):
+    if encoding == 'gz':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return brotli.compress(data, quality=level)
+
+
+# Return: list of [extension, compressed data] of variants of data
+def compress_variants(data, precompress):
+    return [[ENCODING_EXTENSIONS[encoding], compress(data, encoding, level)] for encoding, level in precompress]
+
+
+# Pool task: write precompressed variants next to file, variants of compressed files aren't written
+# Accept: args - [path, precompress]
+def compress_file(args):
+    path, precompress = args
+    if any(path.endswith(extension) for extension in ENCODING_EXTENSIONS.values()):
+        return
+    with open(path, 'rb') as f:
+        data = f.read()
+    for extension, variant in compress_variants(data, precompress):
+        with open(path + extension + '.tmp', 'wb') as f:
+            f.write(variant)
+        os.replace(path + extension + '.tmp', path + extension)
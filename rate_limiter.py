@@ -0,0 +1,74 @@
+import random
+import time
+from collections import deque
+
+
+# Google Sheets API quota: requests per minute per user
+REQUESTS_PER_MINUTE = 60
+# Http statuses of errors which can be retried
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    # Sliding window rate limit with exponential backoff retries for google api requests
+    # Accept: max_calls - requests in period (seconds), max_retries - retries of one request,
+    #   backoff_base, backoff_max - first and maximum backoff delay (seconds),
+    #   clock, sleep, rand - time source, sleep function and random [0; 1) source (for tests)
+    def __init__(self, max_calls=REQUESTS_PER_MINUTE, period=60.0, max_retries=5, backoff_base=1.0,
+                 backoff_max=64.0, clock=time.monotonic, sleep=time.sleep, rand=random.random):
+        self.max_calls = max_calls
+        self.period = period
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self.rand = rand
+
+        # Start times of requests in current window
+        self.calls_times = deque()
+        self.stats = {'calls': 0, 'waits': 0, 'wait_time': 0.0, 'retries': 0, 'retry_time': 0.0}
+
+    # Wait until request can be sent without exceeding the limit
+    def acquire(self):
+        now = self.clock()
+        while True:
+            while len(self.calls_times) > 0 and self.calls_times[0] <= now - self.period:
+                self.calls_times.popleft()
+            if len(self.calls_times) < self.max_calls:
+                break
+
+            wait_time = self.calls_times[0] + self.period - now
+            self.stats['waits'] += 1
+            self.stats['wait_time'] += wait_time
+            self.sleep(wait_time)
+            now = self.clock()
+
+        self.calls_times.append(now)
+        self.stats['calls'] += 1
+
+    # Execute google api request under rate limit, retryable errors are retried with backoff and jitter
+    # Accept: request - object with execute() (google api request)
+    # Return: result of request
+    def execute(self, request):
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                return request.execute()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * self.rand()
+                self.stats['retries'] += 1
+                self.stats['retry_time'] += delay
+                self.sleep(delay)
+                attempt += 1
+
+    # Too many requests, server errors and connection errors can be retried
+    @staticmethod
+    def is_retryable(error):
+        resp = getattr(error, 'resp', None)
+        if resp is not None:
+            return getattr(resp, 'status', None) in RETRY_STATUSES
+        return isinstance(error, (ConnectionError, TimeoutError))
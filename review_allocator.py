@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class ReviewAllocator:
+    # Per-section queues of shuffled reviews, reviews are given out by moving cursor of section queue
+    # Accept: review_store - ReviewStore, given out reviews are marked used in it, seed - seed of shuffle,
+    #   None - random seed
+    def __init__(self, review_store, seed=None):
+        # Seed is kept by checkpoint, so resumed run gets the same queues
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy)
+        rng = np.random.default_rng(self.seed)
+        self.review_store = review_store
+        self.queues = {}
+        self.cursors = {}
+        for section_id, indices in review_store.get_section_indices().items():
+            self.queues[section_id] = rng.permutation(indices)
+            self.cursors[section_id] = 0
+
+    # Getting reviews of section_id not used before, if reviews count less then minimum_reviews return [],
+    # if count more then maximum_reviews return maximum_reviews reviews
+    def allocate(self, minimum_reviews, maximum_reviews, section_id):
+        return self.get_texts(self.allocate_indices(minimum_reviews, maximum_reviews, section_id))
+
+    # Same as allocate, return: list of indexes of reviews in reviews file
+    def allocate_indices(self, minimum_reviews, maximum_reviews, section_id):
+        queue = self.queues.get(section_id)
+        if queue is None:
+            return []
+
+        start = self.cursors[section_id]
+        end = min(start + maximum_reviews, len(queue))
+        if end - start < minimum_reviews:
+            return []
+
+        self.cursors[section_id] = end
+        self.review_store.set_used(queue[start:end])
+        return queue[start:end].tolist()
+
+    # Return: dict {sectionId: count of reviews not given out yet}
+    def get_available_counts(self):
+        return {section_id: len(queue) - self.cursors[section_id] for section_id, queue in self.queues.items()}
+
+    # Return: list of texts of reviews by indexes
+    def get_texts(self, indices):
+        return [self.review_store.get_text(index) for index in indices]
+
+    # Return: list of [review, sectionId] of reviews by indexes, None if some index is out of reviews
+    def get_rows(self, indices):
+        if any(index < 0 or index >= len(self.review_store) for index in indices):
+            return None
+        return [[self.review_store.get_text(index), self.review_store.get_section_id(index)] for index in indices]
+
+    # Mark reviews as used by sites of previous run, they are removed from queues before allocating
+    # Accept: indices - list of indexes of reviews in reviews file
+    def reserve(self, indices):
+        if len(indices) == 0:
+            return
+        self.review_store.set_used(indices)
+        for section_id, queue in self.queues.items():
+            self.queues[section_id] = queue[~self.review_store.is_used(queue)]
+
+    # Return: column used of reviews file, 1.0 for given out and reserved reviews, else 0.0
+    def used_column(self):
+        return self.review_store.used_column()
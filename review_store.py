@@ -0,0 +1,104 @@
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Rows of reviews file read at once
+REVIEW_CHUNK_SIZE = 100000
+
+
+class ReviewStore:
+    # Reviews of goods.csv: only columns review and sectionId are loaded, texts are kept in one utf-8 buffer,
+    # sectionId as integer code, used flags as bitset
+    # Accept: reviews_csv_file - tab separated file with columns review, sectionId,
+    #   buffer_file - if set texts are streamed to this file and memory-mapped instead of kept in memory
+    def __init__(self, reviews_csv_file, buffer_file=None, chunk_size=REVIEW_CHUNK_SIZE):
+        # sectionId by code
+        self.section_ids = []
+        section_codes = {}
+        codes = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        position = 0
+        texts = []
+
+        buffer = open(buffer_file, 'wb') if buffer_file is not None else None
+        try:
+            for chunk in pd.read_csv(reviews_csv_file, sep='\t', usecols=['review', 'sectionId'], dtype=str,
+                                     keep_default_na=False, chunksize=chunk_size):
+                # Codes of chunk are mapped to codes of whole file
+                chunk_codes, chunk_section_ids = pd.factorize(chunk['sectionId'])
+                codes_map = np.empty(len(chunk_section_ids), dtype=np.int32)
+                for i, section_id in enumerate(chunk_section_ids):
+                    if section_id not in section_codes:
+                        section_codes[section_id] = len(self.section_ids)
+                        self.section_ids.append(section_id)
+                    codes_map[i] = section_codes[section_id]
+                codes.append(codes_map[chunk_codes])
+
+                encoded = [text.encode('utf-8') for text in chunk['review'].values]
+                lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+                offsets.append(position + np.cumsum(lengths))
+                position += int(lengths.sum())
+                if buffer is not None:
+                    buffer.write(b''.join(encoded))
+                else:
+                    texts.append(b''.join(encoded))
+        finally:
+            if buffer is not None:
+                buffer.close()
+
+        self.codes = np.concatenate(codes) if len(codes) > 0 else np.zeros(0, dtype=np.int32)
+        self.offsets = np.concatenate(offsets)
+        if buffer_file is not None and position > 0:
+            with open(buffer_file, 'rb') as f:
+                self.texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.texts = b''.join(texts)
+        self.used = np.zeros((len(self.codes) + 7) // 8, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def get_text(self, index):
+        return self.texts[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+    def get_section_id(self, index):
+        return self.section_ids[self.codes[index]]
+
+    # Return: dict {sectionId: array of indexes of reviews of section in file order}
+    def get_section_indices(self):
+        order = np.argsort(self.codes, kind='stable')
+        bounds = np.cumsum(np.bincount(self.codes, minlength=len(self.section_ids)))
+        return {section_id: indices for section_id, indices in zip(self.section_ids, np.split(order, bounds[:-1]))}
+
+    # Mark reviews as used
+    # Accept: indices - list or array of indexes of reviews
+    def set_used(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        np.bitwise_or.at(self.used, indices >> 3, np.left_shift(1, indices & 7).astype(np.uint8))
+
+    # Return: bool array, True for used reviews of indices
+    def is_used(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        return (self.used[indices >> 3] >> (indices & 7)) & 1 == 1
+
+    # Return: column used of reviews file, 1.0 for used reviews, else 0.0
+    def used_column(self):
+        return np.unpackbits(self.used, bitorder='little')[:len(self.codes)].astype(float)
+
+    # Write used flags to column used of reviews file, other columns are copied as is
+    # Accept: reviews_csv_file - file which store was loaded from, out_file - result file, None - replace
+    #   reviews_csv_file
+    def write_used(self, reviews_csv_file, out_file=None, chunk_size=REVIEW_CHUNK_SIZE):
+        out_file = out_file if out_file is not None else reviews_csv_file
+        used = self.used_column()
+        start = 0
+        with open(out_file + '.tmp', 'w', encoding='utf-8', newline='') as f:
+            for chunk in pd.read_csv(reviews_csv_file, sep='\t', dtype=str, keep_default_na=False,
+                                     chunksize=chunk_size):
+                chunk['used'] = used[start:start + len(chunk)]
+                chunk.to_csv(f, sep='\t', index=False, header=start == 0)
+                start += len(chunk)
+        os.replace(out_file + '.tmp', out_file)
@@ -0,0 +1,29 @@
+import hashlib
+
+
+# Shard of section, stable across hosts and runs (python hash of str is salted per process)
+# Return: shard index, 0 <= index < shards_count
+def get_shard(section_id, shards_count):
+    return int(hashlib.sha1(str(section_id).encode('utf-8')).hexdigest(), 16) % shards_count
+
+
+# Parse shard of command line
+# Accept: text - 'i/N', 0 <= i < N
+# Return: [i, N]
+def parse_shard(text):
+    try:
+        index, count = [int(value) for value in text.split('/')]
+    except ValueError:
+        raise Exception('Bad shard ' + text + ', expected i/N')
+    if count < 1 or not 0 <= index < count:
+        raise Exception('Bad shard ' + text + ', expected 0 <= i < N')
+    return [index, count]
+
+
+# Containers of shard, all reviews of section are in one shard, so shards never give out same review
+# Accept: section_ids - Series of sectionId, shard - [i, N]
+# Return: bool Series
+def get_shard_mask(section_ids, shard):
+    index, count = shard
+    shards = {section_id: get_shard(section_id, count) for section_id in section_ids.unique()}
+    return section_ids.map(shards) == index
@@ -0,0 +1,31 @@
+import os
+import pickle
+
+
+class SheetSnapshot:
+    # Local binary copy of normalized sheets tables of google document, keyed by document modified time
+    # Accept: directory - directory of snapshots, table_id - ID Google Sheets document
+    def __init__(self, directory, table_id):
+        self.path = os.path.join(directory, table_id + '.pkl')
+
+    # Load tables of snapshot
+    # Accept: revision - modified time of document, None - load last snapshot regardless of revision (offline)
+    # Return: dict {sheet name: DataFrame} or None if there is no snapshot of this revision
+    def load(self, revision=None):
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if revision is not None and snapshot['revision'] != revision:
+            return None
+        return snapshot['tables']
+
+    # Save tables as snapshot of revision, replace previous snapshot of document
+    def save(self, revision, tables):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Temporary file of process, shards on one host can save snapshot at the same time
+        temp_path = self.path + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'revision': revision, 'tables': tables}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+from sites_generator import SitesGenerator, SITE_URL, NUM_THREADS, PRECOMPRESS, PROFILE_FILE, SNAPSHOT_DIRECTORY, \
+    MASTER_MINIMUM_COUNT, MASTER_MAXIMUM_COUNT, MINIFY_HTML, CONTENT_SEED, METRICS_FILE, VALIDATE_STRUCTURED_DATA
+from site_renderer import SiteRenderer, init_batch_worker, site_task, get_template_version
+from checkpoint import Checkpoint
+from precompress import check_encodings
+
+
+# Sites generated at the same time, serial stages of site (planning, publishing, report) run while pages of other
+# sites are rendered by pool
+BATCH_PARALLEL_SITES = 2
+# Keys of site definition of batch config and their defaults, None - key is required. Run report of site is
+# written to metrics_file, '' - file named METRICS_FILE next to out directory of site (out.metrics.jsonl)
+SITE_KEYS = {
+    'table_id': None,
+    'reviews_csv_file': None,
+    'out_directory': None,
+    'site_url': SITE_URL,
+    'incremental': True,
+    'template_directory': '',
+    'metrics_file': '',
+}
+
+
+# Load site definitions of batch
+# Accept: config_file - json file {'sites': [{'table_id', 'reviews_csv_file', 'out_directory', 'site_url',
+#   'incremental', 'template_directory', 'metrics_file'}]}
+# Return: list of site dicts with defaults of SITE_KEYS
+def load_batch_config(config_file):
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    sites = []
+    for i, site in enumerate(config['sites']):
+        unknown = set(site) - set(SITE_KEYS)
+        if len(unknown) > 0:
+            raise Exception('Site ' + str(i) + ' of ' + config_file + ' has unknown keys: ' +
+                            ', '.join(sorted(unknown)))
+        for key, default in SITE_KEYS.items():
+            if key not in site and default is None:
+                raise Exception('Site ' + str(i) + ' of ' + config_file + ' has no ' + key)
+        site = dict(SITE_KEYS, **site)
+        if site['metrics_file'] == '':
+            site['metrics_file'] = os.path.normpath(site['out_directory']) + '.' + METRICS_FILE \
+                if METRICS_FILE is not None else None
+        sites.append(site)
+
+    for key in ['out_directory', 'metrics_file']:
+        paths = [os.path.normpath(site[key]) for site in sites if site[key] is not None]
+        if len(set(paths)) != len(paths):
+            raise Exception('Sites of ' + config_file + ' have same ' + key)
+    return sites
+
+
+class SitePool:
+    # Pool of batch used by generator of one site, tasks are run by site_task with renderer of site
+    # Accept: pool - Pool with init_batch_worker, site_key - key of renderer of site
+    def __init__(self, pool, site_key):
+        self.pool = pool
+        self.site_key = site_key
+
+    def gen_tasks(self, func, iterable):
+        for args in iterable:
+            yield [self.site_key, func, args]
+
+    def map(self, func, iterable, chunksize=None):
+        return self.pool.map(site_task, self.gen_tasks(func, iterable), chunksize)
+
+    def imap(self, func, iterable, chunksize=1):
+        return self.pool.imap(site_task, self.gen_tasks(func, iterable), chunksize)
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return self.pool.imap_unordered(site_task, self.gen_tasks(func, iterable), chunksize)
+
+    # Accept: args - tuple of one argument of func, as tasks of map
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        return self.pool.apply_async(site_task, ([self.site_key, func] + list(args),), callback=callback,
+                                     error_callback=error_callback)
+
+
+class SiteBatch:
+    # Several sites generated by one process: interpreter, imports and pool of workers are started once,
+    # compiled templates and master cards are shared by sites with same template files
+    # Accept: sites - site dicts of load_batch_config
+    def __init__(self, sites, parallel_sites=BATCH_PARALLEL_SITES):
+        self.sites = sites
+        self.parallel_sites = parallel_sites
+        self.generators = []
+        # Renderers with compiled templates by template version
+        self.renderers = {}
+        # Summaries of sites printed by threads one by one
+        self.print_lock = threading.Lock()
+
+    # Renderer of site, templates are compiled once per template version
+    def get_renderer(self, template_directory):
+        version = get_template_version(template_directory, MINIFY_HTML)
+        if version not in self.renderers:
+            self.renderers[version] = SiteRenderer(MASTER_MINIMUM_COUNT, MASTER_MAXIMUM_COUNT, MINIFY_HTML,
+                                                   CONTENT_SEED, template_directory)
+            return self.renderers[version]
+        return self.renderers[version].share_templates(CONTENT_SEED)
+
+    # Create generators of sites and load their sheets data
+    def download_data(self, token, snapshot_directory=SNAPSHOT_DIRECTORY, offline=False):
+        for site in self.sites:
+            print('Load data of', site['site_url'])
+            generator = SitesGenerator(site['reviews_csv_file'], self.get_renderer(site['template_directory']))
+            generator.download_data(token, site['table_id'], snapshot_directory, offline)
+            self.generators.append(generator)
+
+    # Generate all sites by one pool. Failed site doesn't stop other sites, its checkpoint is kept
+    # Accept: resume - continue interrupted sites of batch from their checkpoints, sites without checkpoint are
+    #   finished and skipped
+    def gen_sites(self, token, resume=False):
+        check_encodings(PRECOMPRESS)
+        runs = []
+        for key, (site, generator) in enumerate(zip(self.sites, self.generators)):
+            if resume and not Checkpoint(site['out_directory']).exists():
+                print('Site', site['site_url'], 'is generated, skipped')
+                continue
+            # Checkpoints set seeds of renderers, so they are started before workers
+            generator.start_run(site['out_directory'], None, resume)
+            runs.append([key, site, generator])
+
+        failed = []
+        renderers = {key: generator.renderer for key, site, generator in runs}
+        with Pool(NUM_THREADS, initializer=init_batch_worker,
+                  initargs=(renderers, PROFILE_FILE, PRECOMPRESS, VALIDATE_STRUCTURED_DATA)) as pool:
+            with ThreadPoolExecutor(self.parallel_sites) as executor:
+                futures = [executor.submit(self.gen_site, token, SitePool(pool, key), site, generator)
+                           for key, site, generator in runs]
+                for (key, site, generator), future in zip(runs, futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print('Site', site['site_url'], 'failed:', repr(e))
+                        failed.append(site['site_url'])
+            # Workers exit by themselves and write their profiles
+            pool.close()
+            pool.join()
+        if len(failed) > 0:
+            raise Exception('Sites failed: ' + ', '.join(failed))
+
+    def gen_site(self, token, pool, site, generator):
+        generator.run_stages(token, site['table_id'], site['out_directory'], site['site_url'], site['incremental'],
+                             pool)
+        with self.print_lock:
+            print('Site', site['site_url'])
+            generator.print_metrics(site['metrics_file'])
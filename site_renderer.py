@@ -0,0 +1,343 @@
+import cProfile
+import copy
+import hashlib
+import os
+import random
+import time
+from multiprocessing.util import Finalize
+
+from page_template import PageTemplate, mark, escape_html_text, escape_html_attribute, STRING_SLOT, ATTRIBUTE_SLOT,\
+    INSERT_SLOT, APPEND_HTML_SLOT
+from master_card import MasterCardRenderer
+from build_manifest import hash_files
+from precompress import compress_variants
+from content_pool import ContentPool
+from structured_data import JsonLdTemplate, validate_blocks
+
+
+"""Templates"""
+PAGE_TEMPLATE_FILE = 'template.html'
+MASTER_ITEM_TEMPLATE_FILE = 'master_item.html'
+QUESTION_SCRIPT_TEMPLATE_FILE = 'question_script_template.json'
+END_SCRIPT_TEMPLATE_FILE = 'end_script_template.json'
+TEMPLATE_FILES = [PAGE_TEMPLATE_FILE, MASTER_ITEM_TEMPLATE_FILE, QUESTION_SCRIPT_TEMPLATE_FILE,
+                  END_SCRIPT_TEMPLATE_FILE]
+
+
+# Paths of template files in template_directory
+def get_template_files(template_directory=''):
+    return [os.path.join(template_directory, file_name) for file_name in TEMPLATE_FILES]
+
+
+# Version of templates, renderers of same version can share compiled templates
+def get_template_version(template_directory='', minify=False):
+    return hash_files(get_template_files(template_directory)) + ('-min' if minify else '')
+
+
+# Append script tag for LocalBusiness block to the end of body
+def append_end_script(soup):
+    new_tag = soup.new_tag('script')
+    soup.body.append(new_tag)
+    new_tag['type'] = 'application/ld+json'
+    return new_tag
+
+
+# Slots of page template: [name, locator, kind, attribute]
+PAGE_SLOTS = [
+    ['title', mark('Container.title'), STRING_SLOT, None],
+    ['description', mark('Container.description'), ATTRIBUTE_SLOT, 'content'],
+    ['name', mark('Container.name'), STRING_SLOT, None],
+    ['masterList', mark('Container.masterList'), STRING_SLOT, None],
+    ['masters', lambda soup: mark('Container.masterList')(soup).parent.div, INSERT_SLOT, None],
+    ['question_1', mark('Container.question_1'), STRING_SLOT, None],
+    ['question_2', mark('Container.question_2'), STRING_SLOT, None],
+    ['question_3', mark('Container.question_3'), STRING_SLOT, None],
+    ['answer_1', mark('Container.answer_1'), STRING_SLOT, None],
+    ['answer_2', mark('Container.answer_2'), STRING_SLOT, None],
+    ['answer_3', mark('Container.answer_3'), STRING_SLOT, None],
+    ['questions_script', lambda soup: soup.find('script', {'type': 'application/ld+json'}), STRING_SLOT, None],
+    ['online_links', lambda soup: mark('Container.linksBlock_1')(soup).parent.ul, APPEND_HTML_SLOT, None],
+    ['local_links', lambda soup: mark('Container.linksBlock_2')(soup).parent.ul, APPEND_HTML_SLOT, None],
+    ['end_script', append_end_script, STRING_SLOT, None],
+]
+
+# Fields of json-ld schemas: [name, keys path, item fields of list]
+QUESTION_FIELDS = [
+    ['question', ['name'], None],
+    ['answer', ['acceptedAnswer', 'text'], None],
+]
+QUESTIONS_SCRIPT_FIELDS = [
+    ['questions', ['mainEntity'], QUESTION_FIELDS],
+]
+END_SCRIPT_FIELDS = [
+    ['name', ['name'], None],
+    ['url', ['url'], None],
+    ['price_range', ['priceRange'], None],
+    ['review_count', ['aggregateRating', 'reviewCount'], None],
+    ['rating_value', ['aggregateRating', 'ratingValue'], None],
+]
+# Columns of questions and answers in Container row
+QUESTION_COLUMNS = [[7, 8], [9, 10], [11, 12]]
+
+
+class SiteRenderer:
+    # Compiled templates and data lookups needed to render pages, loaded once per worker process
+    # Accept: master_minimum_count, master_maximum_count - limits of masters count on page,
+    #   minify - minify static parts of page and master cards, content_seed - seed of random content of pages,
+    #   template_directory - directory of template files
+    def __init__(self, master_minimum_count, master_maximum_count, minify=False, content_seed=None,
+                 template_directory=''):
+        self.master_minimum_count = master_minimum_count
+        self.master_maximum_count = master_maximum_count
+        self.data_model = None
+        # Keys of compiled master cards by master path, hash of master data
+        self.card_keys = {}
+
+        page_file, master_item_file, question_script_file, end_script_file = get_template_files(template_directory)
+        # Template parsed once, pages are rendered by joining its fragments
+        self.page_template = PageTemplate.load(page_file, PAGE_SLOTS, minify)
+        # Static parts of master cards, filled once per master
+        self.master_cards = MasterCardRenderer(master_item_file, minify)
+        # Json-ld blocks, schemas parsed once
+        self.questions_script = JsonLdTemplate.load(question_script_file, QUESTIONS_SCRIPT_FIELDS)
+        self.end_script = JsonLdTemplate.load(end_script_file, END_SCRIPT_FIELDS)
+        # Pages rendered by other version of templates must be rendered again
+        self.template_version = get_template_version(template_directory, minify)
+        # Seconds spent on master cards of current page
+        self.timings = {'card_compile': 0.0, 'card_render': 0.0}
+        # Bytes removed by minification from current page
+        self.saved_bytes = 0
+        # Json-ld blocks of current page
+        self.structured_data = []
+        # Reviewer names, dates, prices and ratings, drawn by urlPath of page
+        self.content_pool = ContentPool(content_seed)
+
+    # Renderer of other site with same templates, compiled templates and master cards are shared, cards are
+    # compiled by master data, so same masters of sites share cards
+    # Accept: content_seed - seed of random content of pages of site
+    def share_templates(self, content_seed=None):
+        renderer = copy.copy(self)
+        renderer.data_model = None
+        renderer.card_keys = {}
+        renderer.timings = {'card_compile': 0.0, 'card_render': 0.0}
+        renderer.content_pool = ContentPool(content_seed)
+        return renderer
+
+    # Set indexed sheets data (SiteDataModel)
+    def set_data_model(self, data_model):
+        self.data_model = data_model
+        self.card_keys = {}
+
+    # Accept: site_data - row of Container, masters - masters paths, reviews - reviews texts,
+    #   online_links, local_links - links to other sites [urlPath, name]
+    # Return: page text
+    def gen_site_code(self, site_data, masters, reviews, online_links=(), local_links=()):
+        # Master list
+        masters_items = []
+        min_len = min(len(masters), len(reviews))
+        content = self.content_pool.draw_page(site_data[2], min_len)
+        for i in range(min_len):
+            master_item = self.gen_master_item(masters[i], reviews[i], i, content)
+            if master_item is not None:
+                masters_items.append(master_item)
+        self.structured_data = [self.get_questions_script(site_data),
+                                self.get_end_script(site_data[3], site_data[2] + '.html', content)]
+
+        # Filling template
+        return self.page_template.render({
+            'title': site_data[5],
+            'description': site_data[6],
+            'name': site_data[3],
+            'masterList': site_data[4],
+            'masters': ''.join(masters_items),
+            'question_1': site_data[7],
+            'question_2': site_data[9],
+            'question_3': site_data[11],
+            'answer_1': site_data[8],
+            'answer_2': site_data[10],
+            'answer_3': site_data[12],
+            'questions_script': self.structured_data[0],
+            'online_links': self.gen_links_items(online_links),
+            'local_links': self.gen_links_items(local_links),
+            'end_script': self.structured_data[1],
+        })
+
+    # Html of items of links block
+    # Accept: links - list of [urlPath, name]
+    @staticmethod
+    def gen_links_items(links):
+        return ''.join(['<li><a href=' + escape_html_attribute('/' + url_path) + '>' + escape_html_text(name) +
+                        '</a></li>' for url_path, name in links])
+
+    # Getting masters paths equal selection_id from selection_master_df
+    # if masters count less then master_minimum_count return [],
+    # if count more then master_maximum_count return master_maximum_count masters
+    def get_masters_paths(self, site):
+        master_paths = list(self.data_model.get_section_masters(site[0]))
+
+        if len(master_paths) > self.master_maximum_count:
+            master_paths = random.sample(master_paths, self.master_maximum_count)
+        if len(master_paths) < self.master_minimum_count:
+            master_paths = []
+
+        return master_paths
+
+    # Count of masters which get_masters_paths returns for site, without sampling
+    def get_masters_count(self, site):
+        count = min(len(self.data_model.get_section_masters(site[0])), self.master_maximum_count)
+        return count if count >= self.master_minimum_count else 0
+
+    # Validate master_path
+    # If count masters with master_path equal 1 return True, else False
+    def valid_master_path(self, master_path):
+        return self.data_model.valid_master_path(master_path)
+
+    # FAQPage block, questions with empty text are left out
+    def get_questions_script(self, site_data):
+        return self.questions_script.render({'questions': [
+            {'question': site_data[question], 'answer': site_data[answer]}
+            for question, answer in QUESTION_COLUMNS if site_data[question] != ''
+        ]})
+
+    # LocalBusiness block
+    # Accept: content - random content of page (ContentPool.draw_page)
+    def get_end_script(self, container_name, url, content):
+        return self.end_script.render({
+            'name': container_name,
+            'url': url,
+            'price_range': content['price_range'],
+            'review_count': content['review_count'],
+            'rating_value': content['rating_value'],
+        })
+
+    # Accept: num - index of card on page, content - random content of page (ContentPool.draw_page)
+    def gen_master_item(self, master, review, num, content):
+        start = time.perf_counter()
+        key = self.card_keys.get(master)
+        if key is None:
+            key = self.card_keys[master] = self.data_model.get_master_hash(master)
+        card = self.master_cards.get(key)
+        if card is None:
+            card = self.master_cards.compile(key, self.data_model.get_master(master),
+                                             self.data_model.get_about(master), self.data_model.get_education(master))
+            self.timings['card_compile'] += time.perf_counter() - start
+            start = time.perf_counter()
+
+        master_item = self.master_cards.render(card, review, content['reviewers'][num],
+                                               content['review_dates'][num], content['minutes'][num], num)
+        self.timings['card_render'] += time.perf_counter() - start
+        self.saved_bytes += card.saved_bytes
+        return master_item
+
+
+"""Pool workers"""
+# Renderer of worker process, set by init_worker once per process
+worker_renderer = None
+# cProfile of render tasks of worker process and its stats file, None if profiling is off
+worker_profiler = None
+worker_profile_file = None
+# Precompressed variants of pages: list of [encoding, level]
+worker_precompress = []
+# Json-ld blocks of rendered pages are checked against schema.org shape
+worker_validate = False
+# Renderers of sites of batch by site key, set by init_batch_worker
+worker_renderers = {}
+
+
+# Pool initializer, renderer is sent to worker once instead of pickling it to every task
+# Accept: profile_file - if set render tasks are profiled to profile_file.<pid>, stats are written when worker
+#   exits, so pool must be closed and joined (terminated workers write nothing),
+#   precompress - list of [encoding, level] of precompressed variants of pages, validate - check json-ld blocks
+#   of rendered pages
+def init_worker(renderer, profile_file=None, precompress=(), validate=False):
+    global worker_renderer, worker_profiler, worker_profile_file, worker_precompress, worker_validate
+    worker_renderer = renderer
+    worker_precompress = list(precompress)
+    worker_validate = validate
+    if profile_file is not None:
+        worker_profiler = cProfile.Profile()
+        worker_profile_file = profile_file + '.' + str(os.getpid())
+        Finalize(None, dump_worker_profile, exitpriority=0)
+
+
+# Write stats of render tasks of worker process, workers without render tasks write nothing
+def dump_worker_profile():
+    if len(worker_profiler.getstats()) > 0:
+        worker_profiler.dump_stats(worker_profile_file)
+
+
+# Pool initializer of batch of sites, renderer of task is chosen by site_task
+# Accept: renderers - dict {site key: SiteRenderer}, renderers with shared templates are pickled once
+def init_batch_worker(renderers, profile_file=None, precompress=(), validate=False):
+    global worker_renderers
+    init_worker(None, profile_file, precompress, validate)
+    worker_renderers = renderers
+
+
+# Pool task of batch: run pool task with renderer of its site
+# Accept: task - [site key, task function, task args]
+def site_task(task):
+    global worker_renderer
+    key, func, args = task
+    worker_renderer = worker_renderers[key]
+    return func(args)
+
+
+# Pool task: select masters of site
+def select_masters(site):
+    return worker_renderer.get_masters_paths(site)
+
+
+# Pool task: render site with links blocks and its precompressed variants, files are written by output writer
+# of main process
+# Accept: args - [site, masters, reviews, online_links, local_links, previous_hash], previous_hash - hash of
+#   page of previous run which is in output with variants, None - page must be written
+# Return: [urlPath, files [[extension, data]] ('' - page itself, [] - page didn't change), page hash or None if
+#   site isn't generated, timings {'card_compile', 'card_render', 'page_render', 'encode', 'compress',
+#   'structured_data', 'total'}, sizes {'page', 'minify_saved'} in bytes, errors of json-ld blocks]
+def render_site(args):
+    site, masters, reviews, online_links, local_links, previous_hash = args
+    files = []
+    page_hash = None
+    timings = {}
+    sizes = {}
+    errors = []
+
+    if worker_profiler is not None:
+        worker_profiler.enable()
+    start = time.perf_counter()
+    if len(reviews) > 0:
+        # Generate site text
+        worker_renderer.timings = {'card_compile': 0.0, 'card_render': 0.0}
+        worker_renderer.saved_bytes = worker_renderer.page_template.saved_bytes
+        site_text = worker_renderer.gen_site_code(site, masters, reviews, online_links, local_links)
+        timings.update(worker_renderer.timings)
+        timings['page_render'] = time.perf_counter() - start - timings['card_compile'] - timings['card_render']
+        encode_start = time.perf_counter()
+        page = site_text.encode('utf-8')
+        page_hash = hashlib.sha1(page).hexdigest()
+        timings['encode'] = time.perf_counter() - encode_start
+        sizes = {'page': len(page), 'minify_saved': worker_renderer.saved_bytes}
+        if page_hash != previous_hash:
+            compress_start = time.perf_counter()
+            files = [['', page]] + compress_variants(page, worker_precompress)
+            timings['compress'] = time.perf_counter() - compress_start
+        if worker_validate:
+            validate_start = time.perf_counter()
+            errors = validate_blocks(worker_renderer.structured_data)
+            timings['structured_data'] = time.perf_counter() - validate_start
+    timings['total'] = time.perf_counter() - start
+    if worker_profiler is not None:
+        worker_profiler.disable()
+
+    return site[2], files, page_hash, timings, sizes, errors
+
+
+# Pool task of stage pipeline: ['select', index, sites] - masters paths of sites by select_masters,
+# ['render', index, list of render_site args] - pages by render_site
+# Return: [kind, index, list of results]
+def pipeline_task(task):
+    kind, index, items = task
+    if kind == 'select':
+        return [kind, index, [select_masters(site) for site in items]]
+    return [kind, index, [render_site(args) for args in items]]
@@ -0,0 +1,126 @@
+import gzip
+import os
+from xml.sax.saxutils import escape
+
+
+# Sitemap protocol limits of one file
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+# Extensions of file and its precompressed variants
+PRECOMPRESS_EXTENSIONS = ['', '.gz', '.br']
+SITEMAP_NAME = 'sitemap'
+SITEMAP_INDEX_NAME = 'sitemap_index'
+SITEMAP_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+SITEMAP_TAIL = '</urlset>'
+SITEMAP_INDEX_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                     '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+SITEMAP_INDEX_TAIL = '</sitemapindex>'
+
+
+class SitemapWriter:
+    # Write sitemap urls to disk while sites are generated, split sitemap to shards by protocol limits
+    # Accept: out_directory - directory of sitemap, base_url - url of site with '/' at the end,
+    #   compress - write gzip shards (.xml.gz)
+    def __init__(self, out_directory, base_url, compress=False, max_urls=SITEMAP_MAX_URLS,
+                 max_bytes=SITEMAP_MAX_BYTES):
+        self.out_directory = out_directory
+        self.base_url = base_url
+        self.compress = compress
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+
+        self.shards = []
+        self.file = None
+        self.urls_count = 0
+        self.bytes_count = 0
+
+        # Main page of site
+        self.add('')
+
+    # Add url of site to sitemap
+    # Accept: site_path - urlPath of site
+    def add(self, site_path):
+        block = self.gen_site_map_block(self.base_url + site_path)
+        block_size = len(block.encode('utf-8'))
+        tail_size = len(SITEMAP_TAIL)
+        if self.file is None or self.urls_count >= self.max_urls or \
+                self.bytes_count + block_size + tail_size > self.max_bytes:
+            self.open_shard()
+
+        self.file.write(block)
+        self.urls_count += 1
+        self.bytes_count += block_size
+
+    # Close current shard and open next one
+    def open_shard(self):
+        self.close_shard()
+        file_name = '{0}-{1}.xml'.format(SITEMAP_NAME, len(self.shards) + 1)
+        self.shards.append(file_name)
+        self.file = self.open_file(file_name)
+        self.file.write(SITEMAP_HEAD)
+        self.urls_count = 0
+        self.bytes_count = len(SITEMAP_HEAD)
+
+    def close_shard(self):
+        if self.file is not None:
+            self.file.write(SITEMAP_TAIL)
+            self.file.close()
+            self.file = None
+
+    # Previous file is removed before writing, with its precompressed variants
+    def open_file(self, file_name):
+        path = os.path.join(self.out_directory, file_name + ('.gz' if self.compress else ''))
+        self.remove_file(file_name + ('.gz' if self.compress else ''))
+        if self.compress:
+            return gzip.open(path, 'wt', encoding='utf-8')
+        return open(path, 'w', encoding='utf-8')
+
+    # Finish sitemap: single shard is renamed to sitemap.xml, several shards are listed in sitemap_index.xml.
+    # Other sitemap files of previous runs (other shards count or compression) are removed
+    # Return: list of written file names
+    def close(self):
+        self.close_shard()
+        extension = '.gz' if self.compress else ''
+        sitemap_name = SITEMAP_NAME + '.xml' + extension
+        index_name = SITEMAP_INDEX_NAME + '.xml'
+
+        if len(self.shards) == 1:
+            os.replace(os.path.join(self.out_directory, self.shards[0] + extension),
+                       os.path.join(self.out_directory, sitemap_name))
+            written = [sitemap_name]
+        else:
+            self.remove_file(index_name)
+            with open(os.path.join(self.out_directory, index_name), 'w', encoding='utf-8') as f:
+                f.write(SITEMAP_INDEX_HEAD)
+                for file_name in self.shards:
+                    f.write('<sitemap>\n<loc>' + escape(self.base_url + file_name + extension) +
+                            '</loc>\n</sitemap>')
+                f.write(SITEMAP_INDEX_TAIL)
+            written = [index_name] + [file_name + extension for file_name in self.shards]
+
+        for file_name in self.get_stale_files(written, os.listdir(self.out_directory)):
+            os.remove(os.path.join(self.out_directory, file_name))
+        return written
+
+    # Sitemap files which are not written by this sitemap, precompressed variants of written files are stale too,
+    # they are compressed again after close
+    # Accept: written - written file names, file_names - file names of directory
+    @staticmethod
+    def get_stale_files(written, file_names):
+        written = set(written)
+        return [file_name for file_name in sorted(file_names)
+                if file_name.startswith(SITEMAP_NAME) and '.xml' in file_name and file_name not in written]
+
+    # Remove sitemap file of previous run with its precompressed variants
+    def remove_file(self, file_name):
+        for extension in PRECOMPRESS_EXTENSIONS:
+            path = os.path.join(self.out_directory, file_name + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def gen_site_map_block(site_path):
+        return '<url>\n<loc>' + escape(site_path) + '</loc>\n<changefreq>weekly</changefreq>\n' \
+               '<priority>1.00</priority>\n</url>'
@@ -1,16 +1,27 @@
-import random
 import os
-import json
 import time
 from multiprocessing import Pool
-from functools import partial
 
 import pandas as pd
 from tqdm import tqdm
 
 from google_sheets_api import GoogleSheetsApi
-from bs4 import BeautifulSoup
-from russian_names import RussianNames
+from data_model import SiteDataModel
+from review_store import ReviewStore
+from review_allocator import ReviewAllocator
+from site_renderer import SiteRenderer, init_worker, select_masters, render_site
+from link_pools import LinkPools
+from sitemap_writer import SitemapWriter
+from build_manifest import BuildManifest, hash_values
+from sheet_snapshot import SheetSnapshot
+from metrics import RunMetrics, profile
+from output_writer import open_output
+from precompress import check_encodings, get_extensions, compress_file
+from structured_data import MAX_PRINTED_ERRORS
+from stage_pipeline import StagePipeline, PIPELINE_BATCH_SIZE
+from sharding import get_shard_mask
+from checkpoint import Checkpoint, RENDER_PHASE, PUBLISHED_PHASE
+from content_pool import ContentPool
 
 
 """List names for downloading"""
@@ -25,25 +36,80 @@ MASTER_MAXIMUM_COUNT = 14
 
 # Num thread for task
 NUM_THREADS = 8
+# Pool tasks are sent by chunks, about this count of chunks per thread
+TASK_CHUNKS_PER_THREAD = 4
 # If true mark generated sites in google_sheets
 MAKE_REPORT = True
-# Google sheets send packet size
-GOOGLE_BLOCK_SIZE = 250
+# If set review texts are kept in this file and memory-mapped instead of memory (very big goods.csv)
+REVIEW_BUFFER_FILE = None
+# If true write used flags of reviews back to column used of goods.csv after generation
+SAVE_USED_REVIEWS = False
+# Url of site in sitemap
+SITE_URL = 'https://dumkii.com/'
+# Output directory or archive (.tar.gz, .zip) of sites
+OUT_DIRECTORY = 'sites'
+# If true write sitemap gzip compressed (sitemap.xml.gz)
+COMPRESS_SITEMAP = False
+PAGE_EXTENSION = '.html'
+# Directory of local snapshots of sheets data
+SNAPSHOT_DIRECTORY = 'snapshots'
+# Run report of stages timings, counters and histograms: *.prom - prometheus textfile, other - JSON lines,
+# None - don't write
+METRICS_FILE = 'metrics.jsonl'
+# If set gen_sites is profiled by cProfile to PROFILE_FILE, render tasks of workers to PROFILE_FILE.<pid>
+PROFILE_FILE = None
+# If true static parts of page and master cards are minified (whitespace, comments, attribute quotes)
+MINIFY_HTML = False
+# Precompressed variants written next to pages and sitemap (page.html.gz, page.html.br): list of [encoding, level],
+# encodings 'gz' (level 1-9) and 'br' (quality 0-11, needs brotli package), e.g. [['gz', 9], ['br', 11]]
+PRECOMPRESS = []
+# Seed of random content of pages (reviewer names, review dates, prices, ratings), pages with equal seed and urlPath
+# get equal content, None - new random content every run
+CONTENT_SEED = None
+# If true json-ld blocks of pages are checked against schema.org shape by workers which render them, errors are
+# printed
+VALIDATE_STRUCTURED_DATA = True
+# If set sites are planned, rendered and written by windows of CHUNK_SIZE containers, so memory doesn't grow with
+# count of sites and rendered pages in memory are limited by window. None - plan all sites before rendering
+CHUNK_SIZE = None
+# If true sites go through master selection, review allocation, rendering and writing as stream, without waiting
+# for stage of all sites. Containers are copied by windows of CHUNK_SIZE
+PIPELINE = False
 
 
 class SitesGenerator:
-    def __init__(self, reviews_csv_file):
+    # Accept: renderer - SiteRenderer of site, None - templates are parsed for this generator
+    def __init__(self, reviews_csv_file, renderer=None):
         self.container_df = pd.DataFrame()
         self.master_data_df = pd.DataFrame()
         self.master_about_df = pd.DataFrame()
         self.selection_master_df = pd.DataFrame()
         self.master_education_df = pd.DataFrame()
-        self.review_df = pd.DataFrame()
+        # Data loaded from snapshot without google api, report isn't sent
+        self.offline = False
+        # [i, N] if only shard i of N shards of containers is generated, None - all containers
+        self.shard = None
+        # Out directory of previous merge of shards, its manifest has previous pages of all shards
+        self.merged_directory = None
+        # Progress of current run, None if run isn't started
+        self.checkpoint = None
+        # Manifest entries of generated sites are kept until the end of run, else they are dropped when pages are
+        # written, set by run_stages
+        self.keep_pages = True
 
         self.master_maximum_count = MASTER_MAXIMUM_COUNT
         self.master_minimum_count = MASTER_MINIMUM_COUNT
 
         self.progress_bar = None
+        # Timings and counters of run
+        self.metrics = RunMetrics()
+
+        # Templates and lookups of pages, sent once to every pool worker
+        self.renderer = renderer
+        if renderer is None:
+            with self.metrics.stage('template_parse'):
+                self.renderer = SiteRenderer(self.master_minimum_count, self.master_maximum_count, MINIFY_HTML,
+                                             CONTENT_SEED)
 
         # Load reviews
         if not os.path.exists(reviews_csv_file):
@@ -51,23 +117,65 @@ class SitesGenerator:
             raise Exception('Bad path to goods_bd file!')
 
         self.reviews_csv_file = reviews_csv_file
-        self.review_df = pd.read_csv(reviews_csv_file, sep='\t')
-        self.review_df = self.review_df.sample(frac=1).reset_index(drop=True)
-        self.review_df['used'] = 0.0
-
-    def download_data(self, token, table_id):
-        # Downloading data from sheets
-        sheets = GoogleSheetsApi(token)
-        container_data = sheets.get_data_from_sheets(table_id, CONTAINER_LIST, 'A2',
-                                'O' + str(sheets.get_list_size(table_id, CONTAINER_LIST)[1]), 'COLUMNS')
-        master_data_data = sheets.get_data_from_sheets(table_id, MASTER_DATA_LIST, 'A2',
-                                'O' + str(sheets.get_list_size(table_id, MASTER_DATA_LIST)[1]), 'COLUMNS')
-        master_about_data = sheets.get_data_from_sheets(table_id, MASTER_ABOUT_LIST, 'A2',
-                                'C' + str(sheets.get_list_size(table_id, MASTER_ABOUT_LIST)[1]), 'COLUMNS')
-        selection_master_data = sheets.get_data_from_sheets(table_id, SELECTION_MASTER_LIST, 'A2',
-                                'B' + str(sheets.get_list_size(table_id, SELECTION_MASTER_LIST)[1]), 'COLUMNS')
-        master_education_data = sheets.get_data_from_sheets(table_id, MASTER_EDUCATION, 'A2',
-                                'B' + str(sheets.get_list_size(table_id, MASTER_EDUCATION)[1]), 'COLUMNS')
+        self.review_store = ReviewStore(reviews_csv_file, REVIEW_BUFFER_FILE)
+        # Reviews are shuffled inside sections of allocator
+        self.review_allocator = ReviewAllocator(self.review_store)
+
+    # Download sheets data, or load it from local snapshot if document wasn't changed after snapshot
+    # Accept: snapshot_directory - directory of snapshots, offline - load last snapshot without google requests
+    def download_data(self, token, table_id, snapshot_directory=SNAPSHOT_DIRECTORY, offline=False):
+        with self.metrics.stage('download'):
+            self.load_tables(token, table_id, snapshot_directory, offline)
+
+    # Load tables from snapshot or sheets and set them
+    def load_tables(self, token, table_id, snapshot_directory, offline):
+        self.offline = offline
+        snapshot = SheetSnapshot(snapshot_directory, table_id)
+        if offline:
+            tables = snapshot.load()
+            if tables is None:
+                print('No snapshot of document!')
+                raise Exception('No snapshot of document ' + table_id)
+            print('Data loaded from snapshot')
+        else:
+            sheets = GoogleSheetsApi(token)
+            revision = sheets.get_modified_time(table_id)
+            # Without modified time snapshot can't be checked, data is downloaded
+            tables = snapshot.load(revision) if revision is not None else None
+            if tables is None:
+                tables = self.download_tables(sheets, table_id)
+                snapshot.save(revision, tables)
+            else:
+                print('Data loaded from snapshot')
+            self.metrics.count_values('sheets_api', sheets.limiter.stats)
+        self.set_tables(tables)
+
+    # Set data frames of sheets and build lookups of renderer
+    # Accept: tables - dict {list name: DataFrame} in format of download_tables
+    def set_tables(self, tables):
+        self.container_df = tables[CONTAINER_LIST]
+        self.master_data_df = tables[MASTER_DATA_LIST]
+        self.master_about_df = tables[MASTER_ABOUT_LIST]
+        self.selection_master_df = tables[SELECTION_MASTER_LIST]
+        self.master_education_df = tables[MASTER_EDUCATION]
+        # Column add as it is in sheet, report sends only changed cells
+        self.downloaded_add = self.container_df['add'].tolist()
+
+        # Indexes for lookups while generating
+        self.renderer.set_data_model(SiteDataModel(self.master_data_df, self.master_about_df,
+                                                   self.master_education_df, self.selection_master_df))
+
+    # Downloading data from sheets
+    # Return: dict {list name: DataFrame}
+    def download_tables(self, sheets, table_id):
+        container_data, master_data_data, master_about_data, selection_master_data, master_education_data = \
+            sheets.get_data_from_sheets_batch(table_id, [
+                [CONTAINER_LIST, 'A2', 'O'],
+                [MASTER_DATA_LIST, 'A2', 'O'],
+                [MASTER_ABOUT_LIST, 'A2', 'C'],
+                [SELECTION_MASTER_LIST, 'A2', 'B'],
+                [MASTER_EDUCATION, 'A2', 'B'],
+            ], 'COLUMNS')
 
         # Data frame filling
         elements_count = len(container_data[0])
@@ -118,407 +226,577 @@ class SitesGenerator:
         self.master_education_df['masterDataId'] = master_education_data[0]
         self.master_education_df['education'] = self.expand_list(master_education_data[1], elements_count)
 
+        return {
+            CONTAINER_LIST: self.container_df,
+            MASTER_DATA_LIST: self.master_data_df,
+            MASTER_ABOUT_LIST: self.master_about_df,
+            SELECTION_MASTER_LIST: self.selection_master_df,
+            MASTER_EDUCATION: self.master_education_df,
+        }
+
     def expand_list(self, arr, size, placeholder=''):
         return arr + ([placeholder]*(size-len(arr)))
 
     def to_bool_list(self, arr):
         return [True if len(i) > 0 else False for i in arr]
 
-    def gen_sites(self, token, table_id, out_directory):
-        # Generate sites
-        print('Generate first sites')
-        firsts_sites = self.container_df[self.container_df['First_add'] == True].values
-        start = time.time()
-        self.gen_sites_by_list_fast4(out_directory, firsts_sites)
-        print('Time: ', time.time()-start)
-
-        print('Generate not firsts sites')
-        start = time.time()
-        not_firsts_sites = self.container_df[self.container_df['First_add'] == False].values
-        self.gen_sites_by_list_fast4(out_directory, not_firsts_sites)
-        print('Time: ', time.time() - start)
-
-        # Link sites
-        print('Link sites')
-        generated_sites = self.container_df[self.container_df['generated'] == True].values
-        for site in tqdm(generated_sites):
-            self.link_site(out_directory, site)
-            self.container_df.loc[self.container_df['urlPath'] == site[2], 'add'] = True
-
-        print('Mapping sites')
-        # Mapping sites
-        map_text = '<?xml version="1.0" encoding="UTF-8"?>\n' \
-                   '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-        map_text += self.gen_site_map_block('https://dumkii.com/')
-        for site in tqdm(generated_sites):
-            map_text += self.gen_site_map_block('https://dumkii.com/'+site[2])
-        map_text += '</urlset>'
-
-        with open(out_directory + 'sitemap.xml', 'w', encoding='utf-8') as f:
-            f.write(map_text)
-
-        # Mark added sites in google table
-        if MAKE_REPORT:
-            print('Mark added sites in google table')
+    # Generate sites, map them and mark generated in google table
+    # Accept: incremental - render only sites which inputs or links changed since previous run
+    #   shard - [i, N] generate only containers of shard i, sitemap and report are made by merge_shards,
+    #   resume - continue run interrupted after its last checkpoint, merged_directory - out directory of previous
+    #   merge_shards, required by incremental shard
+    def gen_sites(self, token, table_id, out_directory, base_url=SITE_URL, incremental=False, shard=None,
+                  resume=False, merged_directory=None):
+        check_encodings(PRECOMPRESS)
+        self.start_run(out_directory, shard, resume, merged_directory)
+        with profile(PROFILE_FILE):
+            self.run_stages(token, table_id, out_directory, base_url, incremental)
+        self.print_metrics(METRICS_FILE)
+
+    # Set shard and checkpoint of run. On resume renderer gets content seed of interrupted run, so pool workers
+    # must be started after it
+    def start_run(self, out_directory, shard=None, resume=False, merged_directory=None):
+        self.shard = shard
+        self.merged_directory = merged_directory
+        self.checkpoint = self.start_checkpoint(out_directory, resume)
+
+    # Print summary of run and write run report
+    # Accept: metrics_file - file of run report, None - report isn't written
+    def print_metrics(self, metrics_file=METRICS_FILE):
+        self.metrics.print_summary()
+        if self.metrics.counters.get('structured_data_errors', 0) > 0:
+            print('Structured data errors:', self.metrics.counters['structured_data_errors'])
+        if self.metrics.counters.get('page_bytes', 0) > 0:
+            print('Pages size: {0:.1f} KB, before minify: {1:.1f} KB'.format(
+                self.metrics.counters['page_bytes'] / 1024, self.metrics.counters['page_bytes_before_minify'] / 1024))
+        if metrics_file is not None:
+            self.metrics.write(metrics_file)
+
+    # Run started by start_run
+    # Accept: out_directory - output directory or archive (.tar, .tar.gz, .zip), pool - pool of workers with
+    #   renderer of generator, None - pool is created for run
+    def run_stages(self, token, table_id, out_directory, base_url, incremental, pool=None):
+        # Pages written before interruption are kept in staging output
+        resume = len(self.checkpoint.pages) > 0
+        if self.checkpoint.phase == PUBLISHED_PHASE:
+            # Output of interrupted run is published, its used reviews and report are left
+            pages = self.checkpoint.pages
+            self.review_allocator.reserve([index for entry in pages.values() for index in entry['reviews']])
+            self.container_df.loc[self.container_df['urlPath'].isin(pages), 'generated'] = True
+        else:
+            # Manifest of shard is read by merge step
+            self.keep_pages = incremental or self.shard is not None
+            output = open_output(out_directory, resume=resume)
+            try:
+                pages = self.gen_output(output, base_url, self.get_previous_pages(out_directory, incremental),
+                                        pool)
+                # Pages and sitemap replace previous output together
+                with self.metrics.stage('publish'):
+                    output.close()
+            finally:
+                output.abort()
+            self.metrics.count_values('output', output.stats)
+
+            if self.keep_pages:
+                with self.metrics.stage('manifest'):
+                    manifest = BuildManifest(out_directory)
+                    manifest.set_pages(pages)
+                    manifest.shard = self.shard
+                    manifest.save()
+            self.checkpoint.save(PUBLISHED_PHASE)
+
+        if SAVE_USED_REVIEWS:
+            with self.metrics.stage('save_used_reviews'):
+                self.review_store.write_used(self.reviews_csv_file)
+
+        self.container_df.loc[self.container_df['generated'] == True, 'add'] = True
+        self.metrics.count('sites', len(self.container_df))
+        self.metrics.count('generated', int((self.container_df['generated'] == True).sum()))
+
+        # Mark added sites in google table, sites of all shards are marked by merge step
+        if MAKE_REPORT and not self.offline and self.shard is None:
+            self.send_report(token, table_id)
+        self.checkpoint.remove()
+
+    # New checkpoint of run, or checkpoint of interrupted run with its seeds of reviews shuffle and page content
+    def start_checkpoint(self, out_directory, resume):
+        checkpoint = Checkpoint(out_directory)
+        if not resume:
+            # Checkpoint of interrupted run isn't resumed
+            checkpoint.remove()
+            checkpoint.shard = self.shard
+            checkpoint.seeds = {'reviews': self.review_allocator.seed, 'content': self.renderer.content_pool.seed}
+            checkpoint.save(RENDER_PHASE)
+            return checkpoint
+
+        checkpoint.load()
+        if checkpoint.shard != self.shard:
+            raise Exception('Checkpoint is of shard ' + str(checkpoint.shard) + ', not ' + str(self.shard))
+        self.review_allocator = ReviewAllocator(self.review_store, checkpoint.seeds['reviews'])
+        self.renderer.content_pool = ContentPool(checkpoint.seeds['content'])
+        self.metrics.count('checkpoint_pages', len(checkpoint.pages))
+        print('Resume', checkpoint.phase, 'phase,', len(checkpoint.pages), 'pages written')
+        return checkpoint
+
+    # Pages which can be reused: published pages of previous run in incremental mode (of all shards in shard mode),
+    # pages written before interruption on resume
+    # Return: BuildManifest, None - render all sites
+    def get_previous_pages(self, out_directory, incremental):
+        if not incremental and len(self.checkpoint.pages) == 0:
+            return None
+        if incremental and self.shard is not None:
+            previous = self.get_merged_pages(out_directory)
+        else:
+            previous = BuildManifest(out_directory)
+        if not incremental:
+            previous.set_pages({})
+        previous.pages.update(self.checkpoint.pages)
+        return previous
+
+    # Pages of all shards of previous run. Every shard reuses plans of all containers from the same manifest of
+    # merge, so shards predict the same generated sites of other shards. Page of shard written again after merge
+    # is rendered again with its merged plan
+    # Return: BuildManifest
+    def get_merged_pages(self, out_directory):
+        if self.merged_directory is None:
+            raise Exception('Incremental shard needs out directory of previous merge')
+        merged = BuildManifest(self.merged_directory)
+        if merged.shard is not None:
+            raise Exception('Manifest of ' + self.merged_directory + ' is of shard ' + str(merged.shard))
+        own = BuildManifest(out_directory)
+        for url_path, entry in merged.pages.items():
+            if own.get(url_path) != entry:
+                entry.pop('page_hash', None)
+        return merged
+
+    # Send changes of column add to google table
+    def send_report(self, token, table_id):
+        print('Mark added sites in google table')
+        with self.metrics.stage('report'):
             sheets = GoogleSheetsApi(token)
-            add_list = self.container_df['add'].tolist()
-            add_list = ['add' if item else '' for item in add_list]
-            sheets.put_column_to_sheets_packets(table_id, CONTAINER_LIST, 'N', 2, add_list, GOOGLE_BLOCK_SIZE)
-
-    def gen_sites_by_list(self, out_directory, sites):
-        for site in sites:
-            self.gen_site(out_directory, site)
-
-    def gen_sites_by_list_fast4(self, out_directory, sites):
-        selection_id_black_list = []
-
-        # Gen master paths parallel
-        pool = Pool(NUM_THREADS)
-        func = partial(self.get_masters_paths, self.master_minimum_count, self.master_maximum_count)
+            add_list = ['add' if item else '' for item in self.container_df['add'].tolist()]
+            downloaded_add_list = ['add' if item else '' for item in self.downloaded_add]
+            requests_count = sheets.put_column_changes_to_sheets(table_id, CONTAINER_LIST, 'N', 2,
+                                                                 downloaded_add_list, add_list)
+        self.metrics.count_values('sheets_api', sheets.limiter.stats)
+        print('Report requests: ', requests_count)
+
+    # Merge step of sharded generation: pages of all shards are checked against global links pools, sitemap of
+    # all pages is written to out_directory and added sites are marked in google table. Manifest of all pages is
+    # saved next to out_directory, it is previous run of next incremental shards. Shards and merge must use
+    # the same sheets data (snapshot)
+    # Accept: shard_directories - out directories of shards, only their manifests are read,
+    #   out_directory - directory of merged site
+    def merge_shards(self, token, table_id, shard_directories, out_directory, base_url=SITE_URL):
+        check_encodings(PRECOMPRESS)
+        if os.path.normpath(out_directory) in [os.path.normpath(directory) for directory in shard_directories]:
+            raise Exception('Out directory of merge ' + out_directory + ' is out directory of shard')
+        with self.metrics.stage('merge'):
+            pages = self.load_shard_pages(shard_directories)
+            generated = self.container_df['urlPath'].isin(pages)
+            self.container_df.loc[generated, 'generated'] = True
+            self.container_df.loc[generated, 'add'] = True
+            generated_sites = self.container_df[generated].values
+
+        # Links of shards were sampled from predicted sites of all shards, they must link generated pages
+        with self.metrics.stage('links'):
+            link_pools = LinkPools(generated_sites)
+            broken_paths = [site[2] for site in generated_sites if not link_pools.valid_links(
+                site, [pages[site[2]]['online_links'], pages[site[2]]['local_links']])]
+        self.metrics.count('broken_links_pages', len(broken_paths))
+        if len(broken_paths) > 0:
+            raise Exception('Pages with links to not generated sites: ' + str(len(broken_paths)) + ' ' +
+                            str(broken_paths[:10]))
+
+        with self.metrics.stage('sitemap'):
+            os.makedirs(out_directory, exist_ok=True)
+            sitemap = SitemapWriter(out_directory, base_url, COMPRESS_SITEMAP)
+            for site in generated_sites:
+                sitemap.add(site[2])
+            for file_name in sitemap.close():
+                if len(PRECOMPRESS) > 0:
+                    compress_file([os.path.join(out_directory, file_name), PRECOMPRESS])
+
+        with self.metrics.stage('manifest'):
+            manifest = BuildManifest(out_directory)
+            manifest.set_pages(pages)
+            manifest.save()
+
+        self.metrics.count('sites', len(self.container_df))
+        self.metrics.count('generated', len(generated_sites))
+        if MAKE_REPORT and not self.offline:
+            self.send_report(token, table_id)
+        self.print_metrics(METRICS_FILE)
+
+    # Pages of manifests of all shards of one run
+    # Return: dict {urlPath: manifest entry}
+    def load_shard_pages(self, shard_directories):
+        pages = {}
+        shards = []
+        for directory in shard_directories:
+            manifest = BuildManifest(directory)
+            if not manifest.exists() or manifest.shard is None:
+                raise Exception('No shard manifest of ' + directory)
+            shards.append(manifest.shard)
+            pages.update(manifest.pages)
+
+        count = shards[0][1] if len(shards) > 0 else 0
+        if sorted(shards) != [[index, count] for index in range(count)]:
+            raise Exception('Manifests are not all shards of one run: ' + str(shards))
+        return pages
+
+    # Plan and render sites to output, sitemap is written to directory of output
+    # Accept: manifest - BuildManifest of previous run, None - render all sites, pool - pool of workers,
+    #   None - pool is created for run
+    # Return: dict {urlPath: manifest entry} of generated sites, empty if keep_pages isn't set
+    def gen_output(self, output, base_url, manifest, pool=None):
+        if pool is None:
+            with Pool(NUM_THREADS, initializer=init_worker,
+                      initargs=(self.renderer, PROFILE_FILE, PRECOMPRESS, VALIDATE_STRUCTURED_DATA)) as pool:
+                pages = self.gen_output(output, base_url, manifest, pool)
+                # Workers exit by themselves and write their profiles
+                pool.close()
+                pool.join()
+                return pages
+
+        # Sites of previous run with same inputs keep their masters and reviews
+        with self.metrics.stage('reuse_plans'):
+            reused_plans = self.reuse_plans(manifest) if manifest is not None else {}
+
+        # Urls are mapped when sites are planned, sitemap of shards is written by merge step
+        sitemap = SitemapWriter(output.directory, base_url, COMPRESS_SITEMAP) if self.shard is None else None
+        if PIPELINE:
+            pages = self.gen_sites_pipelined(pool, output, sitemap, manifest, reused_plans,
+                                             CHUNK_SIZE or max(1, len(self.container_df)))
+        elif CHUNK_SIZE is None:
+            pages = self.gen_all_sites(pool, output, sitemap, manifest, reused_plans)
+        else:
+            pages = self.gen_sites_by_windows(pool, output, sitemap, manifest, reused_plans, CHUNK_SIZE)
+        if sitemap is not None:
+            with self.metrics.stage('sitemap'):
+                sitemap_files = sitemap.close()
+                pool.map(compress_file, [[os.path.join(output.directory, file_name), PRECOMPRESS]
+                                         for file_name in sitemap_files if len(PRECOMPRESS) > 0])
+                # Published sitemap files which are not written again
+                for file_name in sitemap.get_stale_files(os.listdir(output.directory), output.list_published()):
+                    output.remove(file_name)
+        return pages
+
+    # Plan all sites, then render them
+    # Return: dict {urlPath: manifest entry} of generated sites
+    def gen_all_sites(self, pool, output, sitemap, manifest, reused_plans):
+        # Links of shard link sites of all shards, they are predicted before reviews are allocated
+        if self.shard is not None:
+            with self.metrics.stage('links'):
+                link_pools = self.get_link_pools(max(1, len(self.container_df)), reused_plans)
+
+        # Select masters and reviews, first sites get reviews before others
+        firsts_group, not_firsts_group = self.get_groups()
+        print('Plan first sites')
+        sites_plans = self.plan_sites(pool, self.container_df[firsts_group].values, reused_plans)
+
+        print('Plan not firsts sites')
+        sites_plans += self.plan_sites(pool, self.container_df[not_firsts_group].values, reused_plans)
+
+        # Links blocks are known before rendering, so every site is written once
+        with self.metrics.stage('links'):
+            if self.shard is None:
+                link_pools = LinkPools([site for site, masters, reviews in sites_plans if len(reviews) > 0])
+            else:
+                self.check_predicted_sites(sites_plans, link_pools)
+
+        print('Generate sites')
+        with self.metrics.stage('render'):
+            return self.render_sites(pool, output, sites_plans, link_pools, sitemap, manifest, reused_plans)
+
+    # Plan and render sites by windows of window_size containers, first sites before others. Links pools are
+    # built before the first window from predicted generated sites
+    # Return: dict {urlPath: manifest entry} of generated sites
+    def gen_sites_by_windows(self, pool, output, sitemap, manifest, reused_plans, window_size):
+        with self.metrics.stage('links'):
+            link_pools = self.get_link_pools(window_size, reused_plans)
+
+        print('Generate sites by windows of', window_size)
+        pages = {}
+        for group in self.get_groups():
+            # Black list of sections is shared by windows of group as by one plan_sites call
+            selection_id_black_list = []
+            for sites in self.get_windows(group, window_size):
+                sites_plans = self.plan_sites(pool, sites, reused_plans, selection_id_black_list)
+                self.check_predicted_sites(sites_plans, link_pools)
+                with self.metrics.stage('render'):
+                    pages.update(self.render_sites(pool, output, sites_plans, link_pools, sitemap, manifest,
+                                                   reused_plans))
+        return pages
+
+    # Stream sites through stage pipeline, links pools are built before from predicted generated sites
+    # Return: dict {urlPath: manifest entry} of generated sites
+    def gen_sites_pipelined(self, pool, output, sitemap, manifest, reused_plans, window_size):
+        groups = self.get_groups()
+        with self.metrics.stage('links'):
+            link_pools = self.get_link_pools(window_size, reused_plans)
+
+        pages = {}
+        generated_paths = []
+        # Black list of sections is shared by batches of group as by one plan_sites call
+        black_lists = [[] for group in groups]
+
+        def allocate(group, sites, new_sites_masters):
+            start = time.perf_counter()
+            sites_plans = self.allocate_sites_reviews(sites, new_sites_masters, reused_plans, black_lists[group])
+            self.metrics.add_time('review_allocation', time.perf_counter() - start)
+            self.check_predicted_sites(sites_plans, link_pools)
+            return self.gen_render_args(output, sites_plans, link_pools, sitemap, manifest, reused_plans, pages,
+                                        generated_paths)
+
+        def write(result):
+            self.write_page(output, result, pages, generated_paths)
+            if len(generated_paths) >= PIPELINE_BATCH_SIZE:
+                self.mark_generated(generated_paths)
+
+        print('Generate sites by pipeline')
+        with self.metrics.stage('pipeline'):
+            batches = ([group, sites] for group, mask in enumerate(groups)
+                       for sites in self.get_windows(mask, window_size, PIPELINE_BATCH_SIZE))
+            StagePipeline(pool, NUM_THREADS, reused_plans).run(batches, allocate, write)
+        self.mark_generated(generated_paths)
+        return pages
+
+    # Masks of containers planned as one plan_sites call: first sites, not first sites. In shard mode only
+    # containers of shard
+    # Return: list of bool Series
+    def get_groups(self):
+        groups = [self.container_df['First_add'] == True, self.container_df['First_add'] == False]
+        if self.shard is None:
+            return groups
+        shard_mask = get_shard_mask(self.container_df['sectionId'], self.shard)
+        return [group & shard_mask for group in groups]
+
+    # Links pools of predicted generated sites of all containers (of all shards in shard mode)
+    def get_link_pools(self, window_size, reused_plans):
+        groups = [self.container_df['First_add'] == True, self.container_df['First_add'] == False]
+        return LinkPools(self.predict_generated_sites([self.get_windows(group, window_size) for group in groups],
+                                                      reused_plans))
+
+    # Links pools are built from predicted sites, planned sites must be the same
+    def check_predicted_sites(self, sites_plans, link_pools):
+        if any((len(reviews) > 0) != link_pools.has_site(site[2]) for site, masters, reviews in sites_plans):
+            raise Exception('Planned sites differ from predicted generated sites')
+
+    # Rows of Container selected by mask by windows, only one window is copied to object array at once
+    # Accept: mask - bool Series of container_df, batch_size - if set windows are yielded by parts of batch_size
+    def get_windows(self, mask, window_size, batch_size=None):
+        positions = mask.to_numpy().nonzero()[0]
+        for start in range(0, len(positions), window_size):
+            sites = self.container_df.iloc[positions[start:start + window_size]].values
+            if batch_size is None:
+                yield sites
+                continue
+            for batch_start in range(0, len(sites), batch_size):
+                yield sites[batch_start:batch_start + batch_size]
+
+    # Sites which will get reviews, counted by rules of select_sites_masters and allocate_sites_reviews
+    # without selecting masters and reviews
+    # Accept: groups - lists of windows of sites, every group is planned as one plan_sites call
+    # Return: generator of [sectionId, location, urlPath, name] of sites
+    def predict_generated_sites(self, groups, reused_plans):
+        available_counts = self.review_allocator.get_available_counts()
+        for windows in groups:
+            selection_id_black_list = set()
+            for sites in windows:
+                for site in sites:
+                    if site[2] not in reused_plans:
+                        masters_count = self.renderer.get_masters_count(site)
+                        if masters_count == 0 or site[0] in selection_id_black_list:
+                            continue
+                        reviews_count = min(masters_count, available_counts.get(site[0], 0))
+                        if reviews_count < self.master_minimum_count:
+                            selection_id_black_list.add(site[0])
+                            continue
+                        available_counts[site[0]] -= reviews_count
+                    yield list(site[:4])
+
+    # Find sites of previous run which inputs didn't change: same container row, templates, masters data
+    # and reviews. Their reviews are reserved in review allocator. Shard reuses plans of other shards too, they
+    # are used by prediction of generated sites only
+    # Return: dict {urlPath: [masters, reviews indexes]}
+    def reuse_plans(self, manifest):
+        reused_plans = {}
+        for site in self.container_df.values:
+            entry = manifest.get(site[2])
+            if entry is None or site[2] in reused_plans:
+                continue
+            if entry['container_hash'] != self.get_container_hash(site) or \
+                    entry['template_version'] != self.renderer.template_version:
+                continue
+            if not all(self.renderer.valid_master_path(master) for master in entry['masters']) or \
+                    not set(entry['masters']) <= set(self.renderer.data_model.get_section_masters(site[0])) or \
+                    entry['masters_hash'] != self.get_masters_hash(entry['masters']):
+                continue
+            review_rows = self.review_allocator.get_rows(entry['reviews'])
+            if review_rows is None or entry['reviews_hash'] != hash_values(sum(review_rows, [])):
+                continue
+            reused_plans[site[2]] = [entry['masters'], entry['reviews']]
+
+        self.review_allocator.reserve([index for masters, reviews in reused_plans.values() for index in reviews])
+        return reused_plans
+
+    # Select masters (parallel) and reviews (one-thread) of sites, reused plans are taken as is
+    # Return: list of [site, masters, reviews indexes]
+    # Accept: selection_id_black_list - sections without reviews found by previous plan_sites calls of same group
+    def plan_sites(self, pool, sites, reused_plans, selection_id_black_list=None):
+        with self.metrics.stage('master_selection'):
+            new_sites_masters = self.select_sites_masters(pool, [site for site in sites
+                                                                 if site[2] not in reused_plans])
+        with self.metrics.stage('review_allocation'):
+            return self.allocate_sites_reviews(sites, new_sites_masters, reused_plans, selection_id_black_list)
+
+    # Gen master paths parallel
+    # Return: list of masters paths in order of sites
+    def select_sites_masters(self, pool, sites):
+        chunk_size = max(1, len(sites) // (NUM_THREADS * TASK_CHUNKS_PER_THREAD))
         sites_masters = []
-        for masters in tqdm(pool.imap_unordered(func, sites), total=len(sites)):
+        for masters in tqdm(pool.imap(select_masters, sites, chunk_size), total=len(sites)):
             sites_masters.append(masters)
-
-        # Gen reviews one-thread
-        sites_reviews = []
-        for i in tqdm(range(len(sites))):
-            if len(sites_masters[i]) != 0 and sites[i][0] not in selection_id_black_list:
-                reviews_buf = self.get_reviews(self.master_minimum_count, len(sites_masters[i]), sites[i][0])
-                sites_reviews.append(reviews_buf)
+        return sites_masters
+
+    # Gen reviews one-thread
+    # Accept: new_sites_masters - masters of sites which are not in reused_plans, in order of sites,
+    #   selection_id_black_list - sections without reviews, sections found here are added to it
+    # Return: list of [site, masters, reviews indexes]
+    def allocate_sites_reviews(self, sites, new_sites_masters, reused_plans, selection_id_black_list=None):
+        if selection_id_black_list is None:
+            selection_id_black_list = []
+        sites_plans = []
+        new_sites_masters = list(reversed(new_sites_masters))
+        for site in tqdm(sites):
+            if site[2] in reused_plans:
+                sites_plans.append([site] + reused_plans[site[2]])
+                continue
+
+            masters = new_sites_masters.pop()
+            if len(masters) != 0 and site[0] not in selection_id_black_list:
+                reviews_buf = self.review_allocator.allocate_indices(self.master_minimum_count, len(masters), site[0])
+                sites_plans.append([site, masters, reviews_buf])
                 if len(reviews_buf) == 0:
-                    selection_id_black_list.append(sites[i][0])
+                    selection_id_black_list.append(site[0])
             else:
-                sites_reviews.append([])
-
-        # Gen sites parallel
-        func = partial(self.gen_site_fast, out_directory)
+                sites_plans.append([site, masters, []])
+
+        return sites_plans
+
+    # Render sites parallel with links blocks, pages are given to output writer, map and mark generated.
+    # In incremental mode reused sites with still valid links are not rendered
+    # Return: dict {urlPath: manifest entry} of generated sites
+    def render_sites(self, pool, output, sites_plans, link_pools, sitemap, manifest=None, reused_plans=None):
+        pages = {}
+        generated_paths = []
+        func_args = self.gen_render_args(output, sites_plans, link_pools, sitemap, manifest, reused_plans, pages,
+                                         generated_paths)
+
+        print('Render', len(func_args), 'of', len(pages), 'sites')
+        chunk_size = max(1, len(func_args) // (NUM_THREADS * TASK_CHUNKS_PER_THREAD))
+        for result in tqdm(pool.imap_unordered(render_site, func_args, chunk_size), total=len(func_args)):
+            self.write_page(output, result, pages, generated_paths)
+        self.mark_generated(generated_paths)
+        return pages
+
+    # Mark generated sites in container_df
+    # Accept: generated_paths - list of urlPath, it is cleared
+    def mark_generated(self, generated_paths):
+        self.container_df.loc[self.container_df['urlPath'].isin(generated_paths), 'generated'] = True
+        del generated_paths[:]
+
+    # Links blocks and manifest entries of planned sites. Generated sites are added to sitemap in order of plan, so
+    # same input gives same sitemap. Reused sites with still valid links and page in output are not rendered
+    # Accept: pages - dict {urlPath: manifest entry}, generated_paths - list of urlPath, both are filled here
+    # Return: list of render_site arguments of sites to render
+    def gen_render_args(self, output, sites_plans, link_pools, sitemap, manifest, reused_plans, pages,
+                        generated_paths):
         func_args = []
-        for i in range(len(sites)):
-            func_args.append([sites[i], sites_masters[i], sites_reviews[i]])
-
-        for generated, url_path in tqdm(pool.imap_unordered(func, func_args), total=len(func_args)):
-            # Mark generated
-            if generated:
-                self.container_df.loc[self.container_df['urlPath'] == url_path, 'generated'] = True
-
-    def gen_site(self, out_directory, site):
-        masters = self.get_masters_paths(self.master_minimum_count, self.master_maximum_count, site)
-        reviews = self.get_reviews(self.master_minimum_count, len(masters), site[0])
-
-        if len(reviews) > 0:
-            # Generate site text
-            site_text = self.gen_site_code(site, masters, reviews)
-            # Save site
-            with open(out_directory + site[2] + '.html', 'w', encoding='utf-8') as f:
-                f.write(site_text)
-            # Mark generated
-            self.container_df.loc[self.container_df['urlPath'] == site[2], 'generated'] = True
-
-    def gen_site_fast(self, out_directory, args):
-        site = args[0]
-        masters = args[1]
-        reviews = args[2]
-        site_generated = False
-
-        if len(reviews) > 0:
-            # Generate site text
-            site_text = self.gen_site_code(site, masters, reviews)
-            # Save site
-            with open(out_directory + site[2] + '.html', 'w', encoding='utf-8') as f:
-                f.write(site_text)
-                site_generated = True
-
-        return site_generated, site[2]
-
-    def link_site(self, out_directory, site):
-        # Open site
-        with open(out_directory+site[2]+'.html', 'r', encoding='utf-8') as f:
-            site_text = f.read()
-        site_item = BeautifulSoup(site_text, "html.parser")
-
-        # Online block
-        online_list = list(self.container_df.loc[(self.container_df.generated == True) &\
-            (self.container_df.location == 'online') & (self.container_df.urlPath != site[2])]\
-            [['urlPath', 'name']].values)
-
-        if len(online_list) > 10:
-            online_list = random.sample(online_list, 10)
-
-        online_block = site_item.find('div', {'data-mark': "Container.linksBlock_1"}).parent.ul
-
-        for i in range(len(online_list)):
-            new_tag = site_item.new_tag('li')
-            new_tag2 = site_item.new_tag('a', href='/'+online_list[i][0])
-            online_block.append(new_tag)
-            online_block.find_all('li')[-1].append(new_tag2)
-            online_block.find_all('a')[-1].string = online_list[i][1]
-
-        # Local block
-        local_list = list(self.container_df.loc[(self.container_df.generated == True) &\
-            (self.container_df.location != 'online') & (self.container_df.urlPath != site[2])]\
-            [['urlPath', 'name']].values)
-
-        if len(local_list) > 10:
-            local_list = random.sample(local_list, 10)
-
-        locale_block = site_item.find('div', {'data-mark': "Container.linksBlock_2"}).parent.ul
-
-        for i in range(len(local_list)):
-            new_tag = site_item.new_tag('li')
-            new_tag2 = site_item.new_tag('a', href='/' + local_list[i][0])
-            locale_block.append(new_tag)
-            locale_block.find_all('li')[-1].append(new_tag2)
-            locale_block.find_all('a')[-1].string = local_list[i][1]
-
-        # Save site
-        with open(out_directory + site[2] + '.html', 'w', encoding='utf-8') as f:
-            f.write(str(site_item))
-
-    def gen_site_code(self, site_data, masters, reviews):
-        # Get template of site
-        with open('template.html', 'r', encoding='utf-8') as f:
-            site_text = f.read()
-        site_item = BeautifulSoup(site_text, "html.parser")
-
-        # Filling template
-        # Info
-        site_item.head.title.string = site_data[5]
-        site_item.find('meta', {'data-mark': 'Container.description'}).attrs['content'] = site_data[6]
-        site_item.find('h1', {'data-mark': 'Container.name'}).string = site_data[3]
-
-        # Master list
-        site_item.find('h2', {'data-mark': 'Container.masterList'}).string = site_data[4]
-        masters_block = site_item.find('h2', {'data-mark': 'Container.masterList'}).parent.div
-
-        min_len = min(len(masters), len(reviews))
-        for i in range(min_len):
-            master_item = self.gen_master_item(masters[i], reviews[i], i)
-            if master_item is not None:
-                masters_block.insert(i, master_item)
-
-        # Questions
-        site_item.find('h3', {'data-mark': 'Container.question_1'}).string = site_data[7]
-        site_item.find('h3', {'data-mark': 'Container.question_2'}).string = site_data[9]
-        site_item.find('h3', {'data-mark': 'Container.question_3'}).string = site_data[11]
-        site_item.find('div', {'data-mark': 'Container.answer_1'}).string = site_data[8]
-        site_item.find('div', {'data-mark': 'Container.answer_2'}).string = site_data[10]
-        site_item.find('div', {'data-mark': 'Container.answer_3'}).string = site_data[12]
-        site_item.find('script', {'type': 'application/ld+json'}).string = self.get_questions_script(site_data)
-
-        new_tag = site_item.new_tag('script')
-        site_item.body.append(new_tag)
-        site_item.find_all('script')[-1]['type'] = 'application/ld+json'
-        site_item.find_all('script')[-1].string = self.get_end_script(site_data[3], site_data[2]+'.html')
-
-        return self.get_html(site_item)
-
-    # Getting reviews equal selection_id from review_df, if reviews count less then minimum_reviews return [],
-    # if count more then maximum_reviews return maximum_reviews reviews
-    def get_reviews(self, minimum_reviews, maximum_reviews, selection_id):
-        review_buf_df = self.review_df[(self.review_df.sectionId == selection_id) &
-                                       (self.review_df.used == 0.0)].head(maximum_reviews)
-        count_reviews = len(review_buf_df.index)
-        if count_reviews < minimum_reviews:
-            reviews_list = []
-        else:
-            self.review_df.at[review_buf_df.index, 'used'] = 1.0
-            reviews_list = list(review_buf_df['review'].tolist())
-
-        return reviews_list
-
-    # Getting masters paths equal selection_id from selection_master_df
-    # if masters count less then minimum_masters return [],
-    # if count more then maximum_masters return maximum_masters masters
-    def get_masters_paths(self, minimum_masters, maximum_masters, site):
-        master_paths = self.selection_master_df[self.selection_master_df['sectionId'] == site[0]]['pathMaster']\
-            .values
-        master_paths = list(filter(lambda x: self.valid_master_path(x), master_paths))
-
-        if len(master_paths) > maximum_masters:
-            master_paths = random.sample(master_paths, maximum_masters)
-        if len(master_paths) < minimum_masters:
-            master_paths = []
-
-        return master_paths
-
-    # Validate master_path
-    # If count masters with master_path equal 1 return True, else False
-    def valid_master_path(self, master_path):
-        masters_count = self.master_data_df[self.master_data_df['path'] == master_path].values
-        return len(masters_count) == 1
-
-    def gen_site_map_block(self, site_path):
-        return '<url>\n<loc>'+site_path+'</loc>\n<changefreq>weekly</changefreq>\n<priority>1.00</priority>\n</url>'
-
-    def get_html(self, soup):
-        site_text = str(soup)
-        site_text = site_text.replace('&lt;', '<')
-        site_text = site_text.replace('&gt;', '>')
-        return site_text
-
-    @staticmethod
-    def get_questions_script(site_data):
-        with open('question_script_template.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        data['mainEntity'][0]['name'] = site_data[7]
-        data['mainEntity'][0]['acceptedAnswer']['text'] = site_data[8]
-        data['mainEntity'][1]['name'] = site_data[9]
-        data['mainEntity'][1]['acceptedAnswer']['text'] = site_data[10]
-        data['mainEntity'][2]['name'] = site_data[11]
-        data['mainEntity'][2]['acceptedAnswer']['text'] = site_data[12]
-
-        return str(json.dumps(data, ensure_ascii=False))
-
-    @staticmethod
-    def get_end_script(container_name, url):
-        with open('end_script_template.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # Gen random price
-        min_price = random.randint(6, 8) * 100 + random.randint(0, 1) * 50
-        if min_price > 800:
-            min_price = 800
-        max_price = random.randint(12, 15) * 100 + random.randint(0, 1) * 50
-        if max_price > 1500:
-            max_price = 1500
-        random_price = 'от ' + str(min_price) + ' до ' + str(max_price) + ' ₽'
-
-        data['name'] = container_name
-        data['url'] = url
-        data['priceRange'] = random_price
-        data['aggregateRating']['reviewCount'] = str(random.randint(400, 2500))
-        data['aggregateRating']['ratingValue'] = str(random.randint(47, 50) / 10)
-
-        return str(json.dumps(data, ensure_ascii=False))
-
-    def gen_master_item(self, master, review, num):
-        # Get author data
-        masters = self.master_data_df[self.master_data_df['path'] == master].values
-        master_data = masters[0]
-
-        # Get template of master item
-        with open('master_item.html', 'r', encoding='utf-8') as f:
-            master_item_text = f.read()
-
-        # Filling template
-        # Info
-        master_item = BeautifulSoup(master_item_text, "html.parser")
-        avatar_src = 'master/' + master_data[2]
-        if avatar_src.split('.')[-1] != 'svg':
-            avatar_src += '.jpg'
-        master_item.find('div', {'data-mark': 'MasterData.logoPath'}).find('img').attrs['src'] = avatar_src
-        master_item.find('h4', {'data-mark': 'MasterData.initials'}).string.replace_with(master_data[1])
-        master_item.find('div', {'data-mark': 'MasterData.rate'}).find('span').string.replace_with(master_data[3])
-        master_item.find('span', {'data-mark': 'MasterData.amount_reviews'})\
-            .string.replace_with('Отзывы: ' + master_data[4])
-        master_item.find('div', {'data-mark': 'MasterData.amount_lessons'}) \
-            .string.replace_with('Уроки: ' + master_data[5])
-
-        # Reviews
-        master_item.find('p', {'data-mark': 'ReviewData.review'}).string.replace_with(review)
-        reviewers_name = RussianNames().get_person().split(' ')[0]
-        master_item.find('div', {'data-mark': 'ReviewData.review_customerName_date'})\
-            .string = '{0} <span>{1}</span>'.format(reviewers_name, self.gen_rand_review_date())
-
-        # About
-        master_about = self.master_about_df[self.master_about_df['masterDataId'] == master].sort_values(['id'])\
-            ['aboutText'].values
-
-        about_block = master_item.find('div', {'data-mark': 'MasterAbout.aboutText'}).parent
-        about_block.div.p.decompose()
-        if len(master_about) > 0:
-            for i in range(len(master_about)):
-                new_tag = master_item.new_tag('p')
-                about_block.div.insert(i, new_tag)
-                about_block.find_all('p')[-1].attrs['class'] = 'hide-item'
-                about_block.find_all('p')[-1].string = master_about[i]
-        else:
-            about_block.decompose()
-
-        # Education
-        master_education = self.master_education_df[self.master_education_df['masterDataId'] == master]\
-            ['education'].values
-
-        education_block = master_item.find('div', {'data-mark': 'MasterEducation.education'}).parent
-        education_block.div.p.decompose()
-        if len(master_education) > 0:
-            for i in range(len(master_education)):
-                new_tag = master_item.new_tag('p')
-                education_block.div.insert(i, new_tag)
-                education_block.find_all('p')[-1].attrs['class'] = 'hide-item'
-                education_block.find_all('p')[-1].string = master_education[i]
-        else:
-            education_block.decompose()
-
-        # Price, work_online, consultation
-        time_spacing = [45, 60]
-        master_item.find('div', {'data-mark': 'MasterData.cost_time'})\
-            .string = "<span>" + master_data[6] + " ₽</span> / " + \
-                      str(time_spacing[random.randint(0, len(time_spacing) - 1)]) + " мин"
-        if not master_data[7]:
-            master_item.find('div', {'data-mark': 'MasterData.work_online'}).decompose()
-        if not master_data[8]:
-            master_item.find('div', {'data-mark': 'MasterData.consultation'}).decompose()
-
-        # Characteristic
-        characteristic_block = master_item.find('div', {'data-mark': 'MasterData.characteristic'}).ul
-        characteristic_block.li.decompose()
-
-        if master_data[9]:
-            new_tag = master_item.new_tag('li')
-            characteristic_block.append(new_tag)
-            characteristic_block.find_all('li')[-1].string = 'Дошкольники'
-
-        if master_data[10]:
-            new_tag = master_item.new_tag('li')
-            characteristic_block.append(new_tag)
-            characteristic_block.find_all('li')[-1].string = 'Начальные классы'
-
-        if master_data[11]:
-            new_tag = master_item.new_tag('li')
-            characteristic_block.append(new_tag)
-            characteristic_block.find_all('li')[-1].string = '5-9 классы'
-
-        if master_data[12]:
-            new_tag = master_item.new_tag('li')
-            characteristic_block.append(new_tag)
-            characteristic_block.find_all('li')[-1].string = '10-11 классы'
-
-        if master_data[13]:
-            new_tag = master_item.new_tag('li')
-            characteristic_block.append(new_tag)
-            characteristic_block.find_all('li')[-1].string = 'Студенты'
-
-        if master_data[14]:
-            new_tag = master_item.new_tag('li')
-            characteristic_block.append(new_tag)
-            characteristic_block.find_all('li')[-1].string = 'Взрослые'
-
-        # Paste nums
-        master_item.find('div', {'class': 'master__left _master-1'})['class'] = 'master__left _master-' + str(num + 1)
-        master_item.find('div', {'class': 'spollers _spollers-1'})['class'] = 'spollers _spollers-'+str(num+1)
-        master_item.find('div', {'data-da': '_master-1,1,991'})['data-da'] = '_master-'+str(num+1)+',1,991'
-        master_item.find('div', {'data-da': '_spollers-1,2,991'})['data-da'] = '_spollers-'+str(num+1)+',2,991'
-
-        return self.get_html(master_item)
-
-    # Return random post date
+        for site, masters, reviews in sites_plans:
+            if len(reviews) == 0:
+                continue
+
+            links_start = time.perf_counter()
+            previous = manifest.get(site[2]) if manifest is not None else None
+            if previous is not None and link_pools.valid_links(site, [previous['online_links'],
+                                                                      previous['local_links']]):
+                online_links, local_links = previous['online_links'], previous['local_links']
+            else:
+                online_links, local_links = link_pools.get_links(site)
+            self.metrics.add_time('page_links', time.perf_counter() - links_start)
+            pages[site[2]] = self.gen_manifest_entry(site, masters, reviews, online_links, local_links)
+            if sitemap is not None:
+                sitemap.add(site[2])
+
+            # Page and its variants of previous run are in output
+            page_files = [site[2] + PAGE_EXTENSION + extension for extension in [''] + get_extensions(PRECOMPRESS)]
+            previous_hash = previous.get('page_hash') if previous is not None and \
+                all(output.exists(file_name) for file_name in page_files) else None
+            if reused_plans is not None and site[2] in reused_plans and previous_hash is not None and \
+                    previous['online_links'] == online_links and previous['local_links'] == local_links:
+                pages[site[2]]['page_hash'] = previous_hash
+                self.add_page(output, site[2], pages, generated_paths)
+                continue
+
+            func_args.append([site, masters, self.review_allocator.get_texts(reviews), online_links, local_links,
+                              previous_hash])
+        return func_args
+
+    # Give rendered page to output writer
+    # Accept: result - result of render_site
+    def write_page(self, output, result, pages, generated_paths):
+        url_path, files, page_hash, timings, sizes, errors = result
+        self.metrics.add_page(timings, sizes)
+        self.count_structured_data_errors(url_path, errors)
+        if page_hash is None:
+            del pages[url_path]
+            return
+        # Page didn't change if files are empty
+        for extension, data in files:
+            output.write(url_path + PAGE_EXTENSION + extension, data)
+        pages[url_path]['page_hash'] = page_hash
+        self.add_page(output, url_path, pages, generated_paths)
+
+    # Add written or reused page to checkpoint, its manifest entry is dropped if keep_pages isn't set
+    def add_page(self, output, url_path, pages, generated_paths):
+        generated_paths.append(url_path)
+        entry = pages[url_path] if self.keep_pages else pages.pop(url_path)
+        if self.checkpoint is None:
+            return
+        self.checkpoint.add(url_path, entry)
+        # Pages are saved to checkpoint when their files are written
+        if self.checkpoint.due():
+            with self.metrics.stage('checkpoint'):
+                output.flush()
+                self.checkpoint.save(RENDER_PHASE)
+
+    # Errors of json-ld blocks of page are counted in metrics, first errors of run are printed
+    def count_structured_data_errors(self, url_path, errors):
+        errors_count = self.metrics.counters.get('structured_data_errors', 0)
+        for error in errors[:max(0, MAX_PRINTED_ERRORS - errors_count)]:
+            print('Structured data of', url_path + ':', error)
+        if len(errors) > 0:
+            self.metrics.count('structured_data_errors', len(errors))
+
+    # Inputs of generated site for build manifest
+    def gen_manifest_entry(self, site, masters, reviews, online_links, local_links):
+        return {
+            'container_hash': self.get_container_hash(site),
+            'template_version': self.renderer.template_version,
+            'masters': list(masters),
+            'masters_hash': self.get_masters_hash(masters),
+            'reviews': [int(index) for index in reviews],
+            'reviews_hash': hash_values(sum(self.review_allocator.get_rows(reviews), [])),
+            'online_links': [list(link) for link in online_links],
+            'local_links': [list(link) for link in local_links],
+        }
+
+    # Hash of Container columns shown on site (sectionId ... answer_3)
     @staticmethod
-    def gen_rand_review_date():
-        dates = (
-            'сегодня',
-            'вчера',
-            '2 дня назад',
-            '3 дня назад',
-            '4 дня назад',
-            '5 дней назад',
-            '6 дней назад',
-            '7 дней назад',
-            '10 дней назад',
-            '20 дней назад',
-            'больше месяца назад'
-        )
-        return dates[random.randint(0, len(dates)-1)]
-
+    def get_container_hash(site):
+        return hash_values(site[:13])
 
+    def get_masters_hash(self, masters):
+        return hash_values([self.renderer.data_model.get_master_hash(master) for master in masters])
@@ -0,0 +1,87 @@
+import queue
+
+from tqdm import tqdm
+
+from site_renderer import pipeline_task
+
+
+# Sites in one selection or render task of pool
+PIPELINE_BATCH_SIZE = 16
+# Tasks given to pool and not returned, per process of pool
+PIPELINE_TASKS_PER_THREAD = 4
+
+
+class StagePipeline:
+    # Sites stream through master selection (pool), review allocation (main process), rendering (pool) and
+    # writing (output writer thread). Selection and render tasks are given to pool one by one by apply_async, so
+    # workers render pages of allocated sites while next sites are selected, and tasks of other users of pool
+    # (sites of batch) aren't queued behind them. Batches are allocated in order of sites by main process, it is
+    # the only writer of review allocator, sitemap and output
+    # Accept: pool - Pool with init_worker, num_threads - processes of pool, reused_plans - dict {urlPath: plan}
+    #   of sites which masters aren't selected
+    def __init__(self, pool, num_threads, reused_plans, batch_size=PIPELINE_BATCH_SIZE,
+                 tasks_per_thread=PIPELINE_TASKS_PER_THREAD):
+        self.pool = pool
+        self.reused_plans = reused_plans
+        self.batch_size = batch_size
+        self.max_tasks = num_threads * tasks_per_thread
+        # Results of tasks and errors of failed tasks, put by callbacks of pool
+        self.results = queue.Queue()
+        self.tasks_count = 0
+        self.batches = None
+        self.batches_count = 0
+        # Batches given to selection {index: [group, sites]} and their selected masters {index: masters}
+        self.pending = {}
+        self.selected = {}
+        self.allocated_count = 0
+
+    # Run batches through pipeline
+    # Accept: batches - iterable of [group, sites] in order of allocation,
+    #   allocate - function(group, sites, new sites masters) return list of render_site args, called in order of
+    #   batches, write - function(render_site result)
+    def run(self, batches, allocate, write):
+        self.batches = iter(batches)
+        progress = tqdm()
+        try:
+            self.submit_selections()
+            while self.tasks_count > 0:
+                result = self.results.get()
+                if isinstance(result, BaseException):
+                    raise result
+                kind, index, items = result
+                self.tasks_count -= 1
+                if kind == 'select':
+                    self.selected[index] = items
+                    self.allocate_selected(allocate)
+                else:
+                    for result in items:
+                        write(result)
+                    progress.update(len(items))
+                self.submit_selections()
+        finally:
+            progress.close()
+
+    def submit(self, task):
+        self.pool.apply_async(pipeline_task, (task,), callback=self.results.put, error_callback=self.results.put)
+        self.tasks_count += 1
+
+    # Give next batches to selection while pool has free places for tasks
+    def submit_selections(self):
+        while self.batches is not None and self.tasks_count < self.max_tasks:
+            batch = next(self.batches, None)
+            if batch is None:
+                self.batches = None
+                return
+            group, sites = batch
+            self.pending[self.batches_count] = batch
+            self.submit(['select', self.batches_count, [site for site in sites if site[2] not in self.reused_plans]])
+            self.batches_count += 1
+
+    # Allocate reviews of selected batches in order of batches and give their pages to rendering
+    def allocate_selected(self, allocate):
+        while self.allocated_count in self.selected:
+            group, sites = self.pending.pop(self.allocated_count)
+            func_args = allocate(group, sites, self.selected.pop(self.allocated_count))
+            self.allocated_count += 1
+            for start in range(0, len(func_args), self.batch_size):
+                self.submit(['render', None, func_args[start:start + self.batch_size]])
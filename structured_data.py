@@ -0,0 +1,138 @@
+import copy
+import json
+import re
+
+
+# Dynamic values are escaped so they can't close script tag or open html comment in it
+SCRIPT_ESCAPES = [['&', '\\u0026'], ['<', '\\u003c'], ['>', '\\u003e']]
+# Private use chars, same as slot marks of page_template, they never appear in schemas or in sheets data
+FIELD_MARK = '\ue000{0}\ue001'
+FIELD_MARK_RE = re.compile('"\ue000(\\d+)\ue001"')
+
+SCHEMA_CONTEXTS = ('https://schema.org', 'http://schema.org')
+# Properties which must be not empty by @type
+REQUIRED_PROPERTIES = {
+    'FAQPage': ['mainEntity'],
+    'Question': ['name', 'acceptedAnswer'],
+    'Answer': ['text'],
+    'LocalBusiness': ['name', 'url', 'address'],
+    'PostalAddress': ['addressCountry', 'addressLocality', 'streetAddress'],
+    'AggregateRating': ['ratingValue', 'reviewCount'],
+}
+# Errors printed by validation pass of run, others are only counted
+MAX_PRINTED_ERRORS = 10
+
+
+# Json string of value, safe in text of script tag
+def escape_json_value(value):
+    text = json.dumps(str(value), ensure_ascii=False)
+    for char, escape in SCRIPT_ESCAPES:
+        text = text.replace(char, escape)
+    return text
+
+
+class JsonLdTemplate:
+    # Accept: fragments - constant pre-encoded parts of json, fields - list of [name, render function] between
+    #   fragments, len(fragments) == len(fields) + 1
+    def __init__(self, fragments, fields):
+        self.fragments = fragments
+        self.fields = fields
+
+    # Compile json schema file, file is read and parsed once
+    # Accept: schema_file - path of json, fields - look compile
+    @classmethod
+    def load(cls, schema_file, fields):
+        with open(schema_file, 'r', encoding='utf-8') as f:
+            return cls.compile(json.load(f), fields)
+
+    # Serialize schema with field marks and split it to constant fragments
+    # Accept: data - parsed schema, fields - list of [name, path, item_fields], path - keys of value in data.
+    #   item_fields None - value is string, else value is list of items rendered by first item of list in data
+    #   compiled with item_fields
+    @classmethod
+    def compile(cls, data, fields):
+        data = copy.deepcopy(data)
+        field_renders = []
+        for i, (name, path, item_fields) in enumerate(fields):
+            parent = data
+            for key in path[:-1]:
+                parent = parent[key]
+            if item_fields is None:
+                field_renders.append([name, escape_json_value])
+            else:
+                field_renders.append([name, cls.compile(parent[path[-1]][0], item_fields).render_list])
+            parent[path[-1]] = FIELD_MARK.format(i)
+
+        parts = FIELD_MARK_RE.split(json.dumps(data, ensure_ascii=False))
+        if len(parts) != 2 * len(fields) + 1:
+            raise Exception('Fields not found in serialized schema')
+        return cls(parts[0::2], [field_renders[int(i)] for i in parts[1::2]])
+
+    # Render json text
+    # Accept: values - dict {field name: str or list of values dicts of items}
+    def render(self, values):
+        parts = [self.fragments[0]]
+        for i, (name, render) in enumerate(self.fields):
+            parts.append(render(values[name]))
+            parts.append(self.fragments[i + 1])
+        return ''.join(parts)
+
+    # Render json array of items
+    def render_list(self, items):
+        return '[' + ', '.join([self.render(values) for values in items]) + ']'
+
+
+# Check json-ld block against expected schema.org shape
+# Return: list of errors
+def validate_json_ld(text):
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        return ['Bad json: ' + str(e)]
+
+    errors = []
+    if not isinstance(data, dict) or data.get('@context') not in SCHEMA_CONTEXTS:
+        errors.append('No schema.org @context')
+    validate_item(data, errors, '')
+    return errors
+
+
+# Check required properties of typed items recursively
+def validate_item(item, errors, path):
+    if isinstance(item, list):
+        for i, value in enumerate(item):
+            validate_item(value, errors, path + '[' + str(i) + ']')
+        return
+    if not isinstance(item, dict):
+        return
+
+    item_type = item.get('@type')
+    for name in REQUIRED_PROPERTIES.get(item_type, []):
+        if item.get(name) in (None, '', [], {}):
+            errors.append(str(item_type) + ' has empty ' + path + '.' + name)
+
+    if item_type == 'FAQPage' and not all(isinstance(question, dict) and question.get('@type') == 'Question'
+                                          for question in item.get('mainEntity') or []):
+        errors.append('FAQPage ' + path + '.mainEntity has not Question items')
+    if item_type == 'AggregateRating':
+        try:
+            rating = float(item['ratingValue'])
+            if not float(item.get('worstRating', 1)) <= rating <= float(item.get('bestRating', 5)):
+                errors.append('AggregateRating ' + path + '.ratingValue out of range')
+            if int(item['reviewCount']) <= 0:
+                errors.append('AggregateRating ' + path + '.reviewCount not positive')
+        except (KeyError, ValueError):
+            errors.append('AggregateRating ' + path + ' has not numeric values')
+
+    for name, value in item.items():
+        validate_item(value, errors, path + '.' + name)
+
+
+# Check json-ld blocks of page
+# Accept: blocks - list of json texts
+# Return: list of errors
+def validate_blocks(blocks):
+    errors = []
+    for text in blocks:
+        errors += validate_json_ld(text)
+    return errors
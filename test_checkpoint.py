@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from checkpoint import Checkpoint, RENDER_PHASE, PUBLISHED_PHASE
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.out_directory = os.path.join(self.work, 'out')
+
+    def tearDown(self):
+        shutil.rmtree(self.work)
+
+    def test_pages_log(self):
+        checkpoint = Checkpoint(self.out_directory, max_pages=2)
+        checkpoint.seeds = {'reviews': 1, 'content': 2}
+        checkpoint.save(RENDER_PHASE)
+        checkpoint.add('a', {'page_hash': 'a1'})
+        self.assertFalse(checkpoint.due())
+        checkpoint.add('b', {'page_hash': 'b1'})
+        # Saved pages aren't kept in memory
+        self.assertTrue(checkpoint.due())
+        checkpoint.save(RENDER_PHASE)
+        self.assertEqual(checkpoint.added, [])
+        self.assertEqual(checkpoint.pages, {})
+        checkpoint.add('a', {'page_hash': 'a2'})
+        checkpoint.save(PUBLISHED_PHASE)
+
+        loaded = Checkpoint(self.out_directory)
+        loaded.load()
+        self.assertEqual(loaded.phase, PUBLISHED_PHASE)
+        self.assertEqual(loaded.seeds, {'reviews': 1, 'content': 2})
+        self.assertEqual(loaded.pages, {'a': {'page_hash': 'a2'}, 'b': {'page_hash': 'b1'}})
+
+        loaded.remove()
+        self.assertFalse(os.path.exists(loaded.path))
+        self.assertFalse(os.path.exists(loaded.pages_path))
+
+    def test_interrupted_save(self):
+        checkpoint = Checkpoint(self.out_directory)
+        checkpoint.add('a', {'page_hash': 'a1'})
+        checkpoint.save(RENDER_PHASE)
+        # Crash while line of page is written
+        with open(checkpoint.pages_path, 'a', encoding='utf-8') as f:
+            f.write('["b", {"page_h')
+
+        loaded = Checkpoint(self.out_directory)
+        loaded.load()
+        self.assertEqual(loaded.pages, {'a': {'page_hash': 'a1'}})
+        loaded.add('c', {'page_hash': 'c1'})
+        loaded.save(RENDER_PHASE)
+
+        loaded = Checkpoint(self.out_directory)
+        loaded.load()
+        self.assertEqual(loaded.pages, {'a': {'page_hash': 'a1'}, 'c': {'page_hash': 'c1'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
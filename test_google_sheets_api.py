@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import httplib2
+from apiclient.errors import HttpError
+
+import benchmark
+import sites_generator
+from google_sheets_api import GoogleSheetsApi
+from sheet_snapshot import SheetSnapshot
+from sites_generator import SitesGenerator, CONTAINER_LIST, MASTER_DATA_LIST, MASTER_ABOUT_LIST, \
+    SELECTION_MASTER_LIST, MASTER_EDUCATION
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeValues:
+    # Accept: response - response of batchGet, calls - list of kwargs of requests
+    def __init__(self, response, calls):
+        self.response = response
+        self.calls = calls
+
+    def batchGet(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeRequest(self.response)
+
+
+class FakeSpreadsheets:
+    def __init__(self, response, calls):
+        self.response = response
+        self.calls = calls
+
+    def values(self):
+        return FakeValues(self.response, self.calls)
+
+
+class FakeSheetsService:
+    # Local fake of sheets discovery client, batchGet requests are recorded to calls
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def spreadsheets(self):
+        return FakeSpreadsheets(self.response, self.calls)
+
+
+class FakeFiles:
+    # Accept: status - http status of error of files().get, None - document has modifiedTime
+    def __init__(self, status, calls):
+        self.status = status
+        self.calls = calls
+
+    def get(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.status is not None:
+            return FakeErrorRequest(self.status)
+        return FakeRequest({'modifiedTime': '2024-01-01T00:00:00.000Z'})
+
+
+class FakeErrorRequest:
+    def __init__(self, status):
+        self.status = status
+
+    def execute(self):
+        raise HttpError(httplib2.Response({'status': str(self.status)}), b'forbidden')
+
+
+class FakeDriveService:
+    # Local fake of drive discovery client, files().get requests are recorded to calls
+    def __init__(self, status=None):
+        self.status = status
+        self.calls = []
+
+    def files(self):
+        return FakeFiles(self.status, self.calls)
+
+
+class GetDataFromSheetsBatchTest(unittest.TestCase):
+    def test_batch_get(self):
+        service = FakeSheetsService({'valueRanges': [
+            {'range': "'Container'!A2:O1000", 'values': [['section'], ['online']]},
+            {'range': "'MasterData'!A2:O1000"},
+            {'range': "'SectionMaster'!A2:B1000", 'values': [['section', 'master']]},
+        ]})
+        sheets = GoogleSheetsApi(None, auth_service=service)
+
+        data = sheets.get_data_from_sheets_batch('table', [
+            ['Container', 'A2', 'O'],
+            ['MasterData', 'A2', 'O'],
+            ['SectionMaster', 'A2', 'B'],
+        ], 'COLUMNS')
+
+        self.assertEqual(service.calls, [{
+            'spreadsheetId': 'table',
+            'ranges': ["'Container'!A2:O", "'MasterData'!A2:O", "'SectionMaster'!A2:B"],
+            'majorDimension': 'COLUMNS',
+        }])
+        # Range without values is empty sheet, order of ranges is kept
+        self.assertEqual(data, [[['section'], ['online']], [], [['section', 'master']]])
+        self.assertEqual(sheets.limiter.stats['calls'], 1)
+
+
+class GetModifiedTimeTest(unittest.TestCase):
+    def test_modified_time(self):
+        drive = FakeDriveService()
+        sheets = GoogleSheetsApi(None, auth_service=FakeSheetsService({}), drive_service=drive)
+        self.assertEqual(sheets.get_modified_time('table'), '2024-01-01T00:00:00.000Z')
+        self.assertEqual(drive.calls, [{'fileId': 'table', 'fields': 'modifiedTime'}])
+
+    def test_drive_not_available(self):
+        # Token without drive.metadata.readonly scope or disabled drive api
+        drive = FakeDriveService(403)
+        sheets = GoogleSheetsApi(None, auth_service=FakeSheetsService({}), drive_service=drive)
+        self.assertIsNone(sheets.get_modified_time('table'))
+        self.assertEqual(len(drive.calls), 1)
+        self.assertEqual(sheets.limiter.stats['retries'], 0)
+        self.assertIsNone(GoogleSheetsApi(None, auth_service=FakeSheetsService({})).get_modified_time('table'))
+
+
+class LoadTablesTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.sheets_api = sites_generator.GoogleSheetsApi
+
+    def tearDown(self):
+        sites_generator.GoogleSheetsApi = self.sheets_api
+        shutil.rmtree(self.work)
+
+    def test_download_without_drive(self):
+        sheets, review_df = benchmark.gen_synthetic_data(20, 2, 10, 1, 1, 50)
+        reviews_csv_file = os.path.join(self.work, 'goods.csv')
+        review_df.to_csv(reviews_csv_file, sep='\t', index=False)
+        # Snapshot of other data, it can't be checked without modified time
+        snapshot_directory = os.path.join(self.work, 'snapshots')
+        old_sheets = benchmark.gen_synthetic_data(10, 2, 10, 1, 1, 50)[0]
+        SheetSnapshot(snapshot_directory, 'table').save(None, benchmark.load_generator(
+            old_sheets, reviews_csv_file).download_tables(benchmark.SyntheticSheets(old_sheets), 'table'))
+
+        service = FakeSheetsService({'valueRanges': [{'values': sheets[list_name]} for list_name in [
+            CONTAINER_LIST, MASTER_DATA_LIST, MASTER_ABOUT_LIST, SELECTION_MASTER_LIST, MASTER_EDUCATION]]})
+        sites_generator.GoogleSheetsApi = lambda token: GoogleSheetsApi(
+            token, auth_service=service, drive_service=FakeDriveService(403))
+        generator = SitesGenerator(reviews_csv_file)
+        generator.download_data(None, 'table', snapshot_directory)
+
+        self.assertEqual(len(service.calls), 1)
+        self.assertEqual(len(generator.container_df), 20)
+        # Downloaded data is the last snapshot of offline runs
+        self.assertEqual(len(SheetSnapshot(snapshot_directory, 'table').load()[CONTAINER_LIST]), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from output_writer import DirectoryOutput
+
+
+class DirectoryOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.out_directory = os.path.join(self.work, 'out')
+
+    def tearDown(self):
+        shutil.rmtree(self.work)
+
+    def read(self, name):
+        with open(os.path.join(self.out_directory, *name.split('/')), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def list_files(self, directory):
+        return sorted(os.path.relpath(os.path.join(root, file_name), directory).replace(os.sep, '/')
+                      for root, directories, file_names in os.walk(directory) for file_name in file_names)
+
+    def test_publish_changed_files(self):
+        output = DirectoryOutput(self.out_directory)
+        for name in ['a.html', 'b.html', 'c.html', 'd/e.html']:
+            output.write(name, 'first ' + name)
+        output.close()
+
+        output = DirectoryOutput(self.out_directory)
+        output.write('a.html', 'second a.html')
+        output.write('f.html', 'second f.html')
+        output.remove('b.html')
+        output.remove('f.html')
+        output.write('f.html', 'third f.html')
+        output.flush()
+        # Files of previous run aren't staged
+        self.assertEqual(self.list_files(output.staging_directory), ['a.html', 'f.html'])
+        self.assertTrue(output.exists('c.html'))
+        self.assertFalse(output.exists('b.html'))
+        self.assertEqual(self.read('a.html'), 'first a.html')
+        output.close()
+
+        self.assertEqual(self.list_files(self.out_directory), ['a.html', 'c.html', 'd/e.html', 'f.html'])
+        self.assertEqual(self.read('a.html'), 'second a.html')
+        self.assertEqual(self.read('f.html'), 'third f.html')
+        self.assertFalse(os.path.exists(output.staging_directory))
+        self.assertFalse(os.path.exists(output.journal_file))
+
+    def test_crashed_publish_finished(self):
+        output = DirectoryOutput(self.out_directory)
+        output.write('a.html', 'first a.html')
+        output.write('b.html', 'first b.html')
+        output.close()
+
+        # Publish is committed by journal, crash before staged files are moved
+        output = DirectoryOutput(self.out_directory)
+        output.write('a.html', 'second a.html')
+        output.remove('b.html')
+        output.stop()
+        output.finish_publish = lambda: None
+        output.publish()
+
+        output = DirectoryOutput(self.out_directory)
+        self.assertEqual(self.list_files(self.out_directory), ['a.html'])
+        self.assertEqual(self.read('a.html'), 'second a.html')
+        self.assertEqual(self.list_files(output.staging_directory), [])
+        output.abort()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+from rate_limiter import RateLimiter
+
+
+class FakeClock:
+    # Time source and sleep of limiter, sleep moves time forward
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    # Error with resp.status as googleapiclient HttpError
+    def __init__(self, status):
+        super().__init__('http ' + str(status))
+        self.resp = FakeResponse(status)
+
+
+class FakeRequest:
+    # Accept: results - errors raised and result returned by execute calls in order
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def make_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock.clock, sleep=clock.sleep, rand=lambda: 1.0, **kwargs)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_window_wait(self):
+        clock = FakeClock()
+        limiter = make_limiter(clock, max_calls=2, period=10.0)
+        limiter.acquire()
+        clock.now = 1.0
+        limiter.acquire()
+        # Third call waits until the first call leaves the window
+        limiter.acquire()
+        self.assertEqual(clock.sleeps, [9.0])
+        self.assertEqual(clock.now, 10.0)
+        self.assertEqual(limiter.stats['calls'], 3)
+        self.assertEqual(limiter.stats['waits'], 1)
+        self.assertEqual(limiter.stats['wait_time'], 9.0)
+
+    def test_retry_backoff(self):
+        clock = FakeClock()
+        limiter = make_limiter(clock, backoff_base=1.0, backoff_max=3.0)
+        request = FakeRequest([FakeHttpError(429), FakeHttpError(500), FakeHttpError(503), 'result'])
+        self.assertEqual(limiter.execute(request), 'result')
+        # Backoff doubles and is capped at backoff_max
+        self.assertEqual(clock.sleeps, [1.0, 2.0, 3.0])
+        self.assertEqual(request.calls, 4)
+        self.assertEqual(limiter.stats['calls'], 4)
+        self.assertEqual(limiter.stats['retries'], 3)
+        self.assertEqual(limiter.stats['retry_time'], 6.0)
+
+    def test_not_retryable_error(self):
+        clock = FakeClock()
+        limiter = make_limiter(clock)
+        for error in [FakeHttpError(404), ValueError('bad')]:
+            request = FakeRequest([error, 'result'])
+            with self.assertRaises(type(error)):
+                limiter.execute(request)
+            self.assertEqual(request.calls, 1)
+        self.assertEqual(clock.sleeps, [])
+        self.assertEqual(limiter.stats['retries'], 0)
+
+    def test_retries_exhausted(self):
+        clock = FakeClock()
+        limiter = make_limiter(clock, max_retries=2, backoff_base=1.0)
+        request = FakeRequest([FakeHttpError(503)] * 3 + ['result'])
+        with self.assertRaises(FakeHttpError):
+            limiter.execute(request)
+        self.assertEqual(request.calls, 3)
+        self.assertEqual(clock.sleeps, [1.0, 2.0])
+        self.assertEqual(limiter.stats['retries'], 2)
+        self.assertEqual(limiter.stats['calls'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
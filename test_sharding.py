@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Process
+
+import benchmark
+import sites_generator
+from build_manifest import BuildManifest
+from sites_generator import CONTAINER_LIST, MASTER_MAXIMUM_COUNT
+from sharding import get_shard
+
+SHARDS_COUNT = 2
+SITE_URL = 'https://example.com/'
+
+
+# Incremental run of one shard, as run by its own host
+def gen_shard(sheets, reviews_csv_file, out_directory, shard, merged_directory):
+    generator = benchmark.load_generator(sheets, reviews_csv_file)
+    generator.gen_sites(None, benchmark.TABLE_ID, out_directory, SITE_URL, True, shard, False, merged_directory)
+
+
+class ShardingTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.num_threads = sites_generator.NUM_THREADS
+        self.metrics_file = sites_generator.METRICS_FILE
+        sites_generator.NUM_THREADS = 2
+        sites_generator.METRICS_FILE = None
+
+    def tearDown(self):
+        sites_generator.NUM_THREADS = self.num_threads
+        sites_generator.METRICS_FILE = self.metrics_file
+        shutil.rmtree(self.work)
+
+    # Shards run by processes at the same time, then merge
+    # Return: merging generator
+    def run_shards(self, sheets, reviews_csv_file):
+        shard_directories = [os.path.join(self.work, 'shard' + str(index)) for index in range(SHARDS_COUNT)]
+        merged_directory = os.path.join(self.work, 'merged')
+        processes = [Process(target=gen_shard, args=(sheets, reviews_csv_file, directory, [index, SHARDS_COUNT],
+                                                     merged_directory))
+                     for index, directory in enumerate(shard_directories)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0] * SHARDS_COUNT)
+
+        generator = benchmark.load_generator(sheets, reviews_csv_file)
+        generator.merge_shards(None, benchmark.TABLE_ID, shard_directories, merged_directory, SITE_URL)
+        return generator
+
+    def test_incremental_shards(self):
+        # Reviews of every section are enough for 5 of its 10 sites
+        sheets, review_df = benchmark.gen_synthetic_data(50, 5, 20, 1, 1, 5 * MASTER_MAXIMUM_COUNT)
+        reviews_csv_file = os.path.join(self.work, 'goods.csv')
+        review_df.to_csv(reviews_csv_file, sep='\t', index=False)
+        generator = self.run_shards(sheets, reviews_csv_file)
+        self.assertEqual(generator.metrics.counters['generated'], 25)
+
+        # New first site of section without free reviews isn't generated, reused sites of its shard keep their
+        # reviews. Other shard must predict it by plans of previous run, else its pages link the new site
+        section_id = 'Section 1'
+        self.assertNotEqual(get_shard(section_id, SHARDS_COUNT), get_shard('Section 3', SHARDS_COUNT))
+        row = [section_id, 'online', 'page-new', 'Name new', 'Masters new', 'Title new', 'Description new',
+               'Question 1?', 'Answer 1', 'Question 2?', 'Answer 2', 'Question 3?', 'Answer 3', '', 'x']
+        for column, value in zip(sheets[CONTAINER_LIST], row):
+            column.append(value)
+        generator = self.run_shards(sheets, reviews_csv_file)
+
+        self.assertEqual(generator.metrics.counters['broken_links_pages'], 0)
+        self.assertEqual(generator.metrics.counters['generated'], 25)
+        pages = BuildManifest(os.path.join(self.work, 'merged')).pages
+        self.assertEqual(len(pages), 25)
+        self.assertNotIn('page-new', pages)
+
+
+if __name__ == '__main__':
+    unittest.main()
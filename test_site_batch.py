@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import benchmark
+import sites_generator
+from site_batch import SiteBatch, load_batch_config
+
+
+class SiteBatchPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.pipeline = sites_generator.PIPELINE
+        sites_generator.PIPELINE = True
+
+    def tearDown(self):
+        sites_generator.PIPELINE = self.pipeline
+        shutil.rmtree(self.work)
+
+    def test_sites_overlap(self):
+        sheets, review_df = benchmark.gen_synthetic_data(150, 10, 30, 2, 1, 1000)
+        reviews_csv_file = os.path.join(self.work, 'goods.csv')
+        review_df.to_csv(reviews_csv_file, sep='\t', index=False)
+        config_file = os.path.join(self.work, 'batch.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({'sites': [{'table_id': 'table', 'reviews_csv_file': reviews_csv_file,
+                                  'out_directory': os.path.join(self.work, name), 'incremental': False,
+                                  'metrics_file': None} for name in ['a', 'b']]}, f)
+
+        batch = SiteBatch(load_batch_config(config_file))
+        batch.generators = [benchmark.load_generator(sheets, reviews_csv_file) for site in batch.sites]
+        # Times of written pages of every site
+        times = []
+        for generator in batch.generators:
+            times.append([])
+
+            def write_page(output, result, pages, generated_paths, write=generator.write_page, site_times=times[-1]):
+                site_times.append(time.time())
+                write(output, result, pages, generated_paths)
+            generator.write_page = write_page
+        batch.gen_sites(None)
+
+        self.assertEqual([len(site_times) for site_times in times], [150, 150])
+        # Pages of one site are written while pages of other site are written
+        self.assertLess(max(min(site_times) for site_times in times), min(max(site_times) for site_times in times))
+        for name in ['a', 'b']:
+            self.assertTrue(os.path.exists(os.path.join(self.work, name, 'sitemap.xml')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from sitemap_writer import SitemapWriter
+
+
+class SitemapWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work)
+
+    def write_sitemap(self, paths, compress=False, max_urls=2):
+        sitemap = SitemapWriter(self.work, 'https://example.com/', compress, max_urls)
+        for path in paths:
+            sitemap.add(path)
+        return sitemap.close()
+
+    def test_stale_files_removed(self):
+        # Index of 3 shards with precompressed variants, then gzip sitemap of 1 shard
+        written = self.write_sitemap(['a', 'b', 'c', 'd'])
+        self.assertEqual(written, ['sitemap_index.xml', 'sitemap-1.xml', 'sitemap-2.xml', 'sitemap-3.xml'])
+        for file_name in written:
+            shutil.copy(os.path.join(self.work, file_name), os.path.join(self.work, file_name + '.br'))
+        open(os.path.join(self.work, 'page.html'), 'w').close()
+
+        written = self.write_sitemap(['a'], compress=True)
+        self.assertEqual(written, ['sitemap.xml.gz'])
+        self.assertEqual(sorted(os.listdir(self.work)), ['page.html', 'sitemap.xml.gz'])
+
+        # Precompressed variant of written file is stale too
+        open(os.path.join(self.work, 'sitemap.xml.gz.br'), 'w').close()
+        self.assertEqual(self.write_sitemap([]), ['sitemap.xml'])
+        self.assertEqual(sorted(os.listdir(self.work)), ['page.html', 'sitemap.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()